@@ -74,13 +74,12 @@ def filter_steps_by_labels_and_name(
     labels: Labels = [],
     name_prefix: Optional[str] = None,
 ) -> List[ComputeStep]:
+    required_labels = frozenset(labels)
+
     res = []
 
     for step in app.steps:
-        for k, v in labels:
-            if (k, v) not in step.labels:
-                break
-        else:
+        if required_labels.issubset(step.labels_set):
             if name_prefix is None or step.name.startswith(name_prefix):
                 res.append(step)
 
@@ -184,6 +183,10 @@ def cli(
 
     if executor == "SingleThreadExecutor":
         ctx.obj["executor"] = SingleThreadExecutor()
+    elif executor == "MultiThreadExecutor":
+        from datapipe.executor import MultiThreadExecutor
+
+        ctx.obj["executor"] = MultiThreadExecutor()
     elif executor == "RayExecutor":
         import ray
 
@@ -237,6 +240,59 @@ def create_all(ctx: click.Context) -> None:
     app.ds.meta_dbconn.sqla_metadata.create_all(app.ds.meta_dbconn.con)
 
 
+def _lint_table(app: DatapipeApp, table_name: str, checks, fix: bool) -> List[str]:
+    """
+    Прогнать линты по одной таблице и вернуть готовые к печати строки -
+    вывод не интерливится при параллельном выполнении.
+    """
+
+    from . import lints
+
+    out: List[str] = [f"Checking '{table_name}': "]
+
+    dt = app.catalog.get_datatable(app.ds, table_name)
+
+    errors = []
+
+    for check in checks:
+        (status, msg) = check.check(dt)
+
+        if status == lints.LintStatus.OK:
+            out.append(".")
+        elif status == lints.LintStatus.SKIP:
+            out.append("S")
+        elif status == lints.LintStatus.FAIL:
+            out.append("[red]F[/red]")
+            errors.append((check, msg))
+
+    if len(errors) == 0:
+        out.append("[green] ok[/green]\n")
+    else:
+        out.append("[red] FAIL[/red]\n")
+        for check, msg in errors:
+            out.append(f" * {check.desc}: {msg}")
+
+            if fix:
+                try:
+                    (fix_status, fix_msg) = check.fix(dt)
+                    if fix_status == lints.LintStatus.OK:
+                        out.append("[green]... FIXED[/green]")
+                    elif fix_status == lints.LintStatus.SKIP:
+                        out.append("[yellow]... SKIPPED[/yellow]")
+                    else:
+                        out.append("[red]... FAILED TO FIX[/red]")
+
+                        if fix_msg:
+                            out.append(fix_msg)
+                except:  # noqa
+                    out.append("[red]... FAILED TO FIX[/red]")
+
+            out.append("\n")
+        out.append("\n")
+
+    return out
+
+
 @cli.command()
 @click.option("--tables", type=click.STRING, default="*")
 @click.option("--fix", is_flag=True, type=click.BOOL, default=False)
@@ -244,6 +300,8 @@ def create_all(ctx: click.Context) -> None:
 def lint(ctx: click.Context, tables: str, fix: bool) -> None:
     app: DatapipeApp = ctx.obj["pipeline"]
 
+    from concurrent.futures import ThreadPoolExecutor
+
     from . import lints
 
     checks = [
@@ -259,48 +317,24 @@ def lint(ctx: click.Context, tables: str, fix: bool) -> None:
     else:
         tables_to_process = tables.split(",")
 
-    for table_name in sorted(tables_to_process):
-        print(f"Checking '{table_name}': ", end="")
+    tables_to_process = sorted(tables_to_process)
 
-        dt = app.catalog.get_datatable(app.ds, table_name)
-
-        errors = []
-
-        for check in checks:
-            (status, msg) = check.check(dt)
-
-            if status == lints.LintStatus.OK:
-                print(".", end="")
-            elif status == lints.LintStatus.SKIP:
-                print("S", end="")
-            elif status == lints.LintStatus.FAIL:
-                rprint("[red]F[/red]", end="")
-                errors.append((check, msg))
+    # Проверки упираются в запросы к базе - гоняем таблицы параллельно,
+    # вывод при этом остается в детерминированном порядке
+    if app.ds.meta_dbconn.supports_concurrent_writes and len(tables_to_process) > 1:
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = pool.map(
+                lambda table_name: _lint_table(app, table_name, checks, fix),
+                tables_to_process,
+            )
 
-        if len(errors) == 0:
-            rprint("[green] ok[/green]")
-        else:
-            rprint("[red] FAIL[/red]")
-            for check, msg in errors:
-                print(f" * {check.desc}: {msg}", end="")
-
-                if fix:
-                    try:
-                        (fix_status, fix_msg) = check.fix(dt)
-                        if fix_status == lints.LintStatus.OK:
-                            rprint("[green]... FIXED[/green]", end="")
-                        elif fix_status == lints.LintStatus.SKIP:
-                            rprint("[yellow]... SKIPPED[/yellow]", end="")
-                        else:
-                            rprint("[red]... FAILED TO FIX[/red]", end="")
-
-                            if fix_msg:
-                                print(fix_msg, end="")
-                    except:  # noqa
-                        rprint("[red]... FAILED TO FIX[/red]", end="")
-
-                print()
-            print()
+            for result in results:
+                for part in result:
+                    rprint(part, end="")
+    else:
+        for table_name in tables_to_process:
+            for part in _lint_table(app, table_name, checks, fix):
+                rprint(part, end="")
 
 
 @cli.group()
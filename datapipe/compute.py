@@ -11,7 +11,8 @@ from datapipe.executor import Executor, ExecutorConfig
 from datapipe.run_config import RunConfig
 from datapipe.store.database import TableStoreDB
 from datapipe.store.table_store import TableStore
-from datapipe.types import ChangeList, IndexDF, Labels, TableOrName
+from datapipe.tracing import maybe_span
+from datapipe.types import ChangeList, DataSchema, IndexDF, Labels, TableOrName
 
 logger = logging.getLogger("datapipe.compute")
 tracer = trace.get_tracer("datapipe.compute")
@@ -79,6 +80,11 @@ class Catalog:
                 name=table_store.name, table_store=table_store
             )
 
+    def get_datatables(
+        self, ds: DataStore, tables: Iterable[TableOrName]
+    ) -> List[DataTable]:
+        return [self.get_datatable(ds, table) for table in tables]
+
 
 @dataclass
 class StepStatus:
@@ -109,6 +115,21 @@ class ComputeStep:
     количество батчей, которые покрывают все измененные индексы.
     """
 
+    # Шагов в большом DAG-е может быть много - слоты избавляют каждый
+    # экземпляр от __dict__ (наследники без __slots__ получают его обратно,
+    # но атрибуты базового класса остаются в слотах)
+    __slots__ = (
+        "_name",
+        "input_dts",
+        "output_dts",
+        "_input_names",
+        "_output_names",
+        "_labels",
+        "_labels_set",
+        "_cached_name",
+        "executor_config",
+    )
+
     def __init__(
         self,
         name: str,
@@ -118,23 +139,49 @@ class ComputeStep:
         executor_config: Optional[ExecutorConfig] = None,
     ) -> None:
         self._name = name
-        self.input_dts = input_dts
-        self.output_dts = output_dts
+        self.input_dts = tuple(input_dts)
+        self.output_dts = tuple(output_dts)
+
+        # Имена таблиц попадают в span-ы и логи на каждой итерации -
+        # считаем их один раз, а не при каждом обращении
+        self._input_names = tuple(i.dt.name for i in input_dts)
+        self._output_names = tuple(o.name for o in output_dts)
         self._labels = labels
+        self._labels_set: Optional[frozenset] = None
+        self._cached_name: Optional[str] = None
         self.executor_config = executor_config
 
     def get_name(self) -> str:
-        ss = [
-            self.__class__.__name__,
-            self._name,
-            *[i.dt.name for i in self.input_dts],
-            *[o.name for o in self.output_dts],
-        ]
+        # Имя шага запрашивается на каждой итерации run_steps (логи, спаны),
+        # а input_dts/output_dts после конструирования не меняются - хэш
+        # достаточно посчитать один раз
+        if self._cached_name is None:
+            self._cached_name = self._compute_name()
+
+        return self._cached_name
+
+    def _compute_name(self) -> str:
+        # blake2b заметно быстрее shake_128, а хэш здесь нужен только как
+        # короткий идентификатор; обновляем хэш по частям, не собирая
+        # промежуточную строку
+        m = hashlib.blake2b(digest_size=5)
 
-        m = hashlib.shake_128()
-        m.update("".join(ss).encode("utf-8"))
+        m.update(self.__class__.__name__.encode("utf-8"))
+        m.update(self._name.encode("utf-8"))
+        for name in self._input_names:
+            m.update(name.encode("utf-8"))
+        for name in self._output_names:
+            m.update(name.encode("utf-8"))
 
-        return f"{self._name}_{m.hexdigest(5)}"
+        return f"{self._name}_{m.hexdigest()}"
+
+    @property
+    def input_names(self) -> Tuple[str, ...]:
+        return self._input_names
+
+    @property
+    def output_names(self) -> Tuple[str, ...]:
+        return self._output_names
 
     @property
     def name(self) -> str:
@@ -144,6 +191,18 @@ class ComputeStep:
     def labels(self) -> Labels:
         return self._labels if self._labels else []
 
+    @property
+    def labels_set(self) -> frozenset:
+        """
+        Метки шага в виде frozenset - для быстрых проверок вхождения при
+        фильтрации шагов.
+        """
+
+        if self._labels_set is None:
+            self._labels_set = frozenset(self.labels)
+
+        return self._labels_set
+
     def get_status(self, ds: DataStore) -> StepStatus:
         raise NotImplementedError
 
@@ -156,18 +215,27 @@ class ComputeStep:
         out_p_keys = set.intersection(*out_p_keys_arr) if len(out_p_keys_arr) else set()
         join_keys = set.intersection(inp_p_keys, out_p_keys)
 
-        key_to_column_type_inp = {
-            column.name: type(column.type)
-            for inp in self.input_dts
-            for column in inp.dt.primary_schema
-            if column.name in join_keys
-        }
-        key_to_column_type_out = {
-            column.name: type(column.type)
-            for inp in self.output_dts
-            for column in inp.primary_schema
-            if column.name in join_keys
-        }
+        def build_key_types(schemas: Iterable[DataSchema]) -> Dict[str, type]:
+            # Одного прохода до покрытия всех join-ключей достаточно - не
+            # сканируем схемы остальных таблиц
+            res: Dict[str, type] = {}
+
+            for schema in schemas:
+                for column in schema:
+                    if column.name in join_keys and column.name not in res:
+                        res[column.name] = type(column.type)
+
+                if len(res) == len(join_keys):
+                    break
+
+            return res
+
+        key_to_column_type_inp = build_key_types(
+            inp.dt.primary_schema for inp in self.input_dts
+        )
+        key_to_column_type_out = build_key_types(
+            out.primary_schema for out in self.output_dts
+        )
 
         for key in join_keys:
             if key_to_column_type_inp[key] != key_to_column_type_out[key]:
@@ -276,12 +344,13 @@ def run_steps(
     executor: Optional[Executor] = None,
 ) -> None:
     for step in steps:
-        with tracer.start_as_current_span(
-            f"{step.get_name()} {[i.dt.name for i in step.input_dts]} -> {[i.name for i in step.output_dts]}"
+        with maybe_span(
+            tracer,
+            f"{step.get_name()} {list(step.input_names)} -> {list(step.output_names)}",
         ):
             logger.info(
                 f"Running {step.get_name()} "
-                f"{[i.dt.name for i in step.input_dts]} -> {[i.name for i in step.output_dts]}"
+                f"{list(step.input_names)} -> {list(step.output_names)}"
             )
 
             step.run_full(ds=ds, run_config=run_config, executor=executor)
@@ -320,31 +389,49 @@ def run_steps_changelist(
     from datapipe.step.batch_transform import BaseBatchTransformStep
 
     current_changes = changelist
-    next_changes = ChangeList()
     iteration = 0
 
+    # Имена span-ов и сообщения логов не меняются между итерациями -
+    # строим их один раз, а не на каждом проходе while-цикла
+    span_names = {
+        step: f"{step.get_name()} "
+        f"{list(step.input_names)} -> {list(step.output_names)}"
+        for step in steps
+    }
+
     with tracer.start_as_current_span("Start pipeline for changelist"):
         while not current_changes.empty() and iteration < 100:
-            with tracer.start_as_current_span("run_steps"):
-                for step in steps:
-                    with tracer.start_as_current_span(
-                        f"{step.get_name()} "
-                        f"{[i.dt.name for i in step.input_dts]} -> {[i.name for i in step.output_dts]}"
-                    ):
-                        logger.info(
-                            f"Running {step.get_name()} "
-                            f"{[i.dt.name for i in step.input_dts]} -> {[i.name for i in step.output_dts]}"
+            # Изменения шагов складываем списком и объединяем один раз в
+            # конце итерации - extend на каждом шаге копировал бы
+            # накопленные индексы заново
+            step_changelists: List[ChangeList] = []
+
+            # Прогоняем только шаги, чьи входы пересекаются с измененными
+            # таблицами - изменения распространяются по ребрам графа, и
+            # если потребителей не осталось, пайплайн сошелся
+            active_tables = set(current_changes.changes.keys())
+            steps_to_run = [
+                step
+                for step in steps
+                if isinstance(step, BaseBatchTransformStep)
+                and active_tables.intersection(step.input_names)
+            ]
+
+            if not steps_to_run:
+                break
+
+            with maybe_span(tracer, "run_steps"):
+                for step in steps_to_run:
+                    with maybe_span(tracer, span_names[step]):
+                        logger.info(f"Running {span_names[step]}")
+
+                        step_changes = step.run_changelist(
+                            ds,
+                            current_changes,
+                            run_config,
+                            executor=executor,
                         )
+                        step_changelists.append(step_changes)
 
-                        if isinstance(step, BaseBatchTransformStep):
-                            step_changes = step.run_changelist(
-                                ds,
-                                current_changes,
-                                run_config,
-                                executor=executor,
-                            )
-                            next_changes.extend(step_changes)
-
-            current_changes = next_changes
-            next_changes = ChangeList()
+            current_changes = ChangeList.merge(step_changelists)
             iteration += 1
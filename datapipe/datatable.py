@@ -1,5 +1,6 @@
 import logging
-from typing import TYPE_CHECKING, Any, Dict, Optional, cast
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple, cast
 
 import pandas as pd
 from opentelemetry import trace
@@ -9,6 +10,7 @@ from datapipe.meta.sql_meta import MetaTable
 from datapipe.run_config import RunConfig
 from datapipe.store.database import DBConn
 from datapipe.store.table_store import TableStore
+from datapipe.tracing import maybe_span
 from datapipe.types import DataDF, IndexDF, MetadataDF, data_to_index, index_difference
 
 if TYPE_CHECKING:
@@ -75,7 +77,7 @@ class DataTable:
         # In case `processed_idx` is not None, check that it contains any of
         # relevant columns
         if processed_idx is not None:
-            relevant_keys = set(self.primary_keys) & set(processed_idx.columns)
+            relevant_keys = sorted(set(self.primary_keys) & set(processed_idx.columns))
             if not relevant_keys:
                 processed_idx = None
 
@@ -83,15 +85,20 @@ class DataTable:
         if data_df.duplicated(self.primary_keys).any():
             raise ValueError("`data_df` index values should be unique")
 
-        changes = [IndexDF(pd.DataFrame(columns=self.primary_keys))]
+        # Пустой чанк без `processed_idx` ничего не меняет - выходим сразу,
+        # не делая ни одного запроса к базе
+        if data_df.empty and processed_idx is None:
+            return cast(IndexDF, pd.DataFrame(columns=self.primary_keys))
 
-        with tracer.start_as_current_span(f"{self.name} store_chunk"):
+        changes = []
+
+        with maybe_span(tracer, f"{self.name} store_chunk"):
             if not data_df.empty:
                 logger.debug(
                     f"Inserting chunk {len(data_df.index)} rows into {self.name}"
                 )
 
-                with tracer.start_as_current_span("get_changes_for_store_chunk"):
+                with maybe_span(tracer, "get_changes_for_store_chunk"):
                     (
                         new_df,
                         changed_df,
@@ -100,23 +107,30 @@ class DataTable:
                     ) = self.meta_table.get_changes_for_store_chunk(data_df, now)
 
                 # TODO implement transaction meckanism
-                with tracer.start_as_current_span("store data"):
+                with maybe_span(tracer, "store data"):
                     self.table_store.insert_rows(new_df)
                     self.table_store.update_rows(changed_df)
 
-                with tracer.start_as_current_span("store metadata"):
-                    self.meta_table.update_rows(
-                        cast(
-                            MetadataDF,
-                            pd.concat(
-                                [
-                                    df
-                                    for df in [new_meta_df, changed_meta_df]
-                                    if not df.empty
-                                ]
-                            ),
+                with maybe_span(tracer, "store metadata"):
+                    if new_df.empty and changed_df.empty and not changed_meta_df.empty:
+                        # Повторная запись без изменений данных - у строк
+                        # метаданных меняется только process_ts, одного
+                        # UPDATE достаточно вместо полного upsert-а
+                        self.meta_table.update_process_ts(
+                            data_to_index(changed_meta_df, self.primary_keys),
+                            now=float(changed_meta_df["process_ts"].iloc[0]),
+                        )
+                    else:
+                        # concat копирует данные - если непустой датафрейм
+                        # только один, передаем его как есть
+                        meta_dfs = [
+                            df for df in [new_meta_df, changed_meta_df] if not df.empty
+                        ]
+                        self.meta_table.update_rows(
+                            meta_dfs[0]
+                            if len(meta_dfs) == 1
+                            else cast(MetadataDF, pd.concat(meta_dfs))
                         )
-                    )
 
                     if not new_df.empty:
                         changes.append(data_to_index(new_df, self.primary_keys))
@@ -125,19 +139,39 @@ class DataTable:
             else:
                 data_df = pd.DataFrame(columns=self.primary_keys)
 
-            with tracer.start_as_current_span("cleanup deleted rows"):
+            with maybe_span(tracer, "cleanup deleted rows"):
                 data_idx = data_to_index(data_df, self.primary_keys)
 
                 if processed_idx is not None:
-                    existing_idx = self.meta_table.get_existing_idx(processed_idx)
-                    deleted_idx = index_difference(existing_idx, data_idx)
+                    # relevant_keys уже вычислены при проверке processed_idx
+                    # в начале метода
+
+                    # Частый случай - ни одной удаленной строки. Все строки
+                    # data_df уже записаны, поэтому если количество живых
+                    # строк в meta под processed_idx совпадает с количеством
+                    # строк data_df, попадающих под processed_idx, удалять
+                    # нечего - и полный SELECT существующих строк не нужен
+                    matched_count = len(
+                        data_idx.merge(
+                            processed_idx[relevant_keys].drop_duplicates(),
+                            on=relevant_keys,
+                        )
+                    )
+                    existing_count = self.meta_table.get_metadata_size(processed_idx)
 
-                    self.delete_by_idx(deleted_idx, now=now, run_config=run_config)
+                    if existing_count != matched_count:
+                        existing_idx = self.meta_table.get_existing_idx(processed_idx)
+                        deleted_idx = index_difference(existing_idx, data_idx)
 
-                    if not deleted_idx.empty:
-                        changes.append(deleted_idx)
+                        self.delete_by_idx(deleted_idx, now=now, run_config=run_config)
 
-        return cast(IndexDF, pd.concat(changes))
+                        if not deleted_idx.empty:
+                            changes.append(deleted_idx)
+
+        if changes:
+            return cast(IndexDF, pd.concat(changes))
+        else:
+            return cast(IndexDF, pd.DataFrame(columns=self.primary_keys))
 
     def delete_by_idx(
         self,
@@ -201,6 +235,47 @@ class DataStore:
 
         return res
 
+    def store_chunks_batch(
+        self,
+        items: List[Tuple[DataTable, DataDF]],
+        processed_idx: Optional[IndexDF] = None,
+        now: Optional[float] = None,
+        run_config: Optional[RunConfig] = None,
+    ) -> List[IndexDF]:
+        """
+        Записать чанки сразу в несколько таблиц. Таблицы независимы, поэтому
+        при поддержке конкурентной записи в мета-базе запись ведется из пула
+        потоков - накладные расходы на запрос амортизируются между
+        выходными таблицами.
+
+        Возвращает список изменившихся индексов в порядке `items`.
+        """
+
+        if len(items) > 1 and self.meta_dbconn.supports_concurrent_writes:
+            with ThreadPoolExecutor(max_workers=min(len(items), 8)) as pool:
+                futures = [
+                    pool.submit(
+                        dt.store_chunk,
+                        data_df,
+                        processed_idx=processed_idx,
+                        now=now,
+                        run_config=run_config,
+                    )
+                    for dt, data_df in items
+                ]
+
+                return [future.result() for future in futures]
+
+        return [
+            dt.store_chunk(
+                data_df,
+                processed_idx=processed_idx,
+                now=now,
+                run_config=run_config,
+            )
+            for dt, data_df in items
+        ]
+
     def get_or_create_table(self, name: str, table_store: TableStore) -> DataTable:
         if name in self.tables:
             return self.tables[name]
@@ -1,13 +1,50 @@
+import queue
+import threading
 from abc import ABC, abstractmethod
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from dataclasses import dataclass
-from typing import Iterable, Optional, Protocol
-
-from tqdm_loggable.auto import tqdm
+from typing import Iterable, Iterator, Optional, Protocol, Set, TypeVar
 
 from datapipe.datatable import DataStore
+from datapipe.progress import progress
 from datapipe.run_config import RunConfig
 from datapipe.types import ChangeList, IndexDF
 
+T = TypeVar("T")
+
+
+def prefetch_iterable(it: Iterable[T], maxsize: int = 2) -> Iterator[T]:
+    """
+    Обернуть итератор в фоновое чтение - producer-поток наполняет ограниченную
+    очередь, пока потребитель обрабатывает текущий элемент. Позволяет
+    совместить получение следующего чанка с обработкой текущего.
+    """
+
+    q: "queue.Queue" = queue.Queue(maxsize=maxsize)
+    _end = object()
+
+    def _producer() -> None:
+        try:
+            for item in it:
+                q.put((item, None))
+        except Exception as e:  # noqa: BLE001
+            q.put((_end, e))
+        else:
+            q.put((_end, None))
+
+    thread = threading.Thread(target=_producer, daemon=True)
+    thread.start()
+
+    while True:
+        item, exc = q.get()
+
+        if item is _end:
+            if exc is not None:
+                raise exc
+            return
+
+        yield item
+
 
 class ProcessFn(Protocol):
     def __call__(
@@ -54,15 +91,97 @@ class SingleThreadExecutor(Executor):
         run_config: Optional[RunConfig] = None,
         executor_config: Optional[ExecutorConfig] = None,
     ) -> ChangeList:
-        res_changelist = ChangeList()
+        # Подтягиваем следующий чанк индексов, пока обрабатывается текущий;
+        # для sqlite соединение нельзя использовать из другого потока
+        if ds.meta_dbconn.supports_concurrent_writes:
+            idx_gen = prefetch_iterable(idx_gen)
+
+        # Изменения батчей накапливаем списком и объединяем один раз -
+        # extend после каждого батча заново копировал бы накопленные индексы
+        changelists = []
 
-        for idx in tqdm(idx_gen, total=idx_count):
+        for idx in progress(idx_gen, total=idx_count):
             changes = process_fn(
                 ds=ds,
                 idx=idx,
                 run_config=run_config,
             )
 
-            res_changelist.extend(changes)
+            changelists.append(changes)
+
+        return ChangeList.merge(changelists)
+
+
+class MultiThreadExecutor(Executor):
+    """
+    Выполняет батчи в пуле потоков одного процесса. Батчи независимы по
+    контракту get_full_process_ids/get_change_list_process_ids, а обработка
+    IO-bound (чтение и запись сторов отпускают GIL), поэтому пул потоков
+    дает выигрыш без сериализации данных между процессами.
+    """
+
+    def __init__(self, max_workers: int = 8) -> None:
+        self.max_workers = max_workers
+
+    def run_process_batch(
+        self,
+        name: str,
+        ds: DataStore,
+        idx_count: int,
+        idx_gen: Iterable[IndexDF],
+        process_fn: ProcessFn,
+        run_config: Optional[RunConfig] = None,
+        executor_config: Optional[ExecutorConfig] = None,
+    ) -> ChangeList:
+        # sqlite держит по соединению на поток, писать в него из пула нельзя
+        if not ds.meta_dbconn.supports_concurrent_writes:
+            return SingleThreadExecutor().run_process_batch(
+                name=name,
+                ds=ds,
+                idx_count=idx_count,
+                idx_gen=idx_gen,
+                process_fn=process_fn,
+                run_config=run_config,
+                executor_config=executor_config,
+            )
+
+        # parallelism в ExecutorConfig - ограничение шага сверху, поэтому
+        # обрезаем им количество батчей в полете, а не расширяем его
+        if executor_config is not None:
+            max_in_flight = min(self.max_workers * 2, executor_config.parallelism)
+        else:
+            max_in_flight = self.max_workers * 2
+
+        # Generator to collect results, so tqdm can show progress
+        def _results(idx_gen: Iterable[IndexDF]) -> Iterator[ChangeList]:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                futures: Set["Future[ChangeList]"] = set()
+
+                for idx in idx_gen:
+                    if len(futures) >= max_in_flight:
+                        done, futures = wait(futures, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            yield future.result()
+
+                    futures.add(
+                        pool.submit(
+                            process_fn,
+                            ds=ds,
+                            idx=idx,
+                            run_config=run_config,
+                        )
+                    )
+
+                while futures:
+                    done, futures = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+
+        # Результаты собираются в основном потоке - блокировка не нужна;
+        # объединяем их одним merge в конце
+        changelists = []
+
+        for result in progress(_results(idx_gen), total=idx_count):
+            changelists.append(result)
 
-        return res_changelist
+        return ChangeList.merge(changelists)
@@ -2,10 +2,9 @@ from functools import wraps
 from typing import Any, Dict, Iterable, Optional
 
 import ray
-from tqdm_loggable.auto import tqdm
-
 from datapipe.datatable import DataStore
 from datapipe.executor import Executor, ExecutorConfig, ProcessFn
+from datapipe.progress import progress
 from datapipe.run_config import RunConfig
 from datapipe.types import ChangeList, IndexDF
 
@@ -21,8 +20,6 @@ class RayExecutor(Executor):
         run_config: Optional[RunConfig] = None,
         executor_config: Optional[ExecutorConfig] = None,
     ) -> ChangeList:
-        res_changelist = ChangeList()
-
         remote_kwargs: Dict[str, Any] = {
             "name": name,
         }
@@ -62,7 +59,10 @@ class RayExecutor(Executor):
                     yield result
                 ready, futures = ray.wait(futures, timeout=None)
 
-        for result in tqdm(_results(idx_gen), total=idx_count):
-            res_changelist.extend(result)
+        # Объединяем изменения одним merge вместо extend на каждый батч
+        changelists = []
+
+        for result in progress(_results(idx_gen), total=idx_count):
+            changelists.append(result)
 
-        return res_changelist
+        return ChangeList.merge(changelists)
@@ -1,5 +1,3 @@
-import itertools
-import math
 import time
 from dataclasses import dataclass
 from typing import (
@@ -11,11 +9,12 @@ from typing import (
     List,
     Literal,
     Optional,
+    Sequence,
     Tuple,
     cast,
 )
 
-import cityhash
+import numpy as np
 import pandas as pd
 import sqlalchemy as sa
 
@@ -38,7 +37,7 @@ if TYPE_CHECKING:
 
 
 TABLE_META_SCHEMA: List[sa.Column] = [
-    sa.Column("hash", sa.Integer),
+    sa.Column("hash", sa.BigInteger),
     sa.Column("create_ts", sa.Float),  # Время создания строки
     sa.Column("update_ts", sa.Float),  # Время последнего изменения
     sa.Column("process_ts", sa.Float),  # Время последней успешной обработки
@@ -120,7 +119,7 @@ class MetaTable:
 
         CHUNK_SIZE = self._chunk_size()
 
-        for chunk_no in range(int(math.ceil(len(idx) / CHUNK_SIZE))):
+        for chunk_no in range(-(-len(idx) // CHUNK_SIZE)):
             chunk_idx = idx.iloc[chunk_no * CHUNK_SIZE : (chunk_no + 1) * CHUNK_SIZE, :]
 
             yield cast(TAnyDF, chunk_idx)
@@ -129,13 +128,19 @@ class MetaTable:
         self, sql, idx: Optional[IndexDF] = None, include_deleted: bool = False
     ):
         if idx is not None:
-            if len(self.primary_keys) == 0:
+            keys = [key for key in self.primary_keys if key in idx.columns]
+
+            if len(keys) == 0:
                 # Когда ключей нет - не делаем ничего
                 pass
 
             else:
                 sql = sql_apply_idx_filter_to_table(
-                    sql, self.sql_table, self.primary_keys, idx
+                    sql,
+                    self.sql_table,
+                    keys,
+                    idx,
+                    supports_values_join=self.dbconn.supports_values_join,
                 )
 
         if not include_deleted:
@@ -144,17 +149,32 @@ class MetaTable:
         return sql
 
     def get_metadata(
-        self, idx: Optional[IndexDF] = None, include_deleted: bool = False
+        self,
+        idx: Optional[IndexDF] = None,
+        include_deleted: bool = False,
+        columns: Optional[List[str]] = None,
     ) -> MetadataDF:
         """
         Получить датафрейм с метаданными.
 
         idx - опциональный фильтр по целевым строкам
         include_deleted - флаг, возвращать ли удаленные строки, по умолчанию = False
+        columns - опциональная проекция не-ключевых колонок; первичные ключи
+        возвращаются всегда
         """
 
+        if columns is None:
+            sql_schema = self.sql_schema
+        else:
+            selected = set(self.primary_keys) | set(columns)
+            sql_schema = [
+                column
+                for column in self.sql_schema
+                if column.name in selected  # type: ignore
+            ]
+
         res = []
-        sql = sa.select(*self.sql_schema)  # type: ignore
+        sql = sa.select(*sql_schema)  # type: ignore
 
         with self.dbconn.con.begin() as con:
             if idx is None:
@@ -171,7 +191,7 @@ class MetaTable:
             else:
                 return cast(
                     MetadataDF,
-                    pd.DataFrame(columns=[column.name for column in self.sql_schema]),  # type: ignore
+                    pd.DataFrame(columns=[column.name for column in sql_schema]),  # type: ignore
                 )
 
     def get_metadata_size(
@@ -214,11 +234,25 @@ class MetaTable:
             + [column.name for column in TABLE_META_SCHEMA]
         )
 
-    def _get_hash_for_df(self, df) -> pd.DataFrame:
-        return df.apply(lambda x: str(list(x)), axis=1).apply(
-            lambda x: int.from_bytes(
-                cityhash.CityHash32(x).to_bytes(4, "little"), "little", signed=True
-            )
+    def _get_hash_for_df(self, df) -> pd.Series:
+        # hash_pandas_object хэширует колонки на уровне C без прохода по
+        # строкам в Python; старый вариант через df.apply(str) был
+        # узким местом store_chunk на широких датафреймах
+        obj_cols = [col for col in df.columns if df.dtypes[col] == object]
+        if obj_cols:
+            # object-колонки могут содержать произвольные значения
+            # (например list), приводим их к строкам перед хэшированием
+            df = df.copy()
+            for col in obj_cols:
+                df[col] = df[col].map(str)
+
+        hashes = pd.util.hash_pandas_object(df, index=False)
+
+        # Реинтерпретируем uint64 как знаковый int64 - колонка hash
+        # хранится как BigInteger
+        return pd.Series(
+            hashes.to_numpy().view(np.int64),
+            index=df.index,
         )
 
     # Fix numpy types in Index
@@ -227,14 +261,19 @@ class MetaTable:
         return param.item() if hasattr(param, "item") else param
 
     def get_existing_idx(self, idx: Optional[IndexDF] = None) -> IndexDF:
-        sql = sa.select(*self.sql_schema)  # type: ignore
+        # Выбираем только ключевые колонки - остальная мета для построения
+        # индекса не нужна
+        if len(self.primary_keys) > 0:
+            sql = sa.select(*[self.sql_table.c[key] for key in self.primary_keys])
+        else:
+            sql = sa.select(*self.sql_schema)  # type: ignore
 
         if idx is not None:
             if len(idx.index) == 0:
                 # Empty index -> empty result
                 return cast(
                     IndexDF,
-                    pd.DataFrame(columns=[column.name for column in self.sql_schema]),  # type: ignore
+                    pd.DataFrame(columns=self.primary_keys),
                 )
             idx_cols = list(set(idx.columns.tolist()) & set(self.primary_keys))
         else:
@@ -242,7 +281,11 @@ class MetaTable:
 
         if len(idx_cols) > 0 and idx is not None and len(idx) > 0:
             sql = sql_apply_idx_filter_to_table(
-                sql=sql, table=self.sql_table, primary_keys=idx_cols, idx=idx
+                sql=sql,
+                table=self.sql_table,
+                primary_keys=idx_cols,
+                idx=idx,
+                supports_values_join=self.dbconn.supports_values_join,
             )
 
         sql = sql.where(self.sql_table.c.delete_ts.is_(None))
@@ -285,13 +328,31 @@ class MetaTable:
         if now is None:
             now = time.time()
 
-        # получить meta по чанку
+        # получить meta по чанку; process_ts и meta-ключи в сравнении не
+        # участвуют - не тащим их из базы
         existing_meta_df = self.get_metadata(
-            data_to_index(data_df, self.primary_keys), include_deleted=True
+            data_to_index(data_df, self.primary_keys),
+            include_deleted=True,
+            columns=["hash", "create_ts", "update_ts", "delete_ts"],
         )
+
+        # После left join колонка hash получила бы NaN и стала float64, а
+        # float64 теряет точность на 64-битных хэшах; nullable Int64
+        # сохраняет точное целочисленное сравнение
+        existing_meta_df["hash"] = existing_meta_df["hash"].astype("Int64")
         data_cols = list(data_df.columns)
         meta_cols = self._get_meta_data_columns()
 
+        # Первичная загрузка - все строки новые, merge и сравнение хэшей
+        # не нужны
+        if existing_meta_df.empty:
+            return (
+                data_df,
+                cast(DataDF, data_df.iloc[0:0]),
+                self._make_new_metadata_df(now, data_df),
+                cast(MetadataDF, pd.DataFrame(columns=meta_cols)),
+            )
+
         # Дополняем данные методанными
         merged_df = pd.merge(
             data_df.assign(data_hash=self._get_hash_for_df(data_df)),
@@ -302,30 +363,40 @@ class MetaTable:
             suffixes=("", "_exist"),
         )
 
-        new_idx = merged_df["hash"].isna() | merged_df["delete_ts"].notnull()
+        # Считаем каждую маску один раз и работаем с numpy-массивами,
+        # чтобы не пересчитывать isna/сравнения на каждом использовании
+        hash_isna = merged_df["hash"].isna().to_numpy()
+        is_deleted = merged_df["delete_ts"].notnull().to_numpy()
+        hash_differs = (
+            (merged_df["hash"] != merged_df["data_hash"])
+            .fillna(False)
+            .to_numpy(dtype=bool)
+        )
+
+        new_idx = hash_isna | is_deleted
 
         # Ищем новые записи
-        new_df = data_df.loc[new_idx.values, data_cols]  # type: ignore
+        new_df = data_df.loc[new_idx, data_cols]  # type: ignore
 
         # Создаем мета данные для новых записей
-        new_meta_data_df = merged_df.loc[merged_df["hash"].isna().values, data_cols]  # type: ignore
+        new_meta_data_df = merged_df.loc[hash_isna, data_cols]  # type: ignore
         new_meta_df = self._make_new_metadata_df(now, new_meta_data_df)
 
         # Ищем изменившиеся записи
-        changed_idx = (
-            (merged_df["hash"].notna())
-            & (merged_df["delete_ts"].isnull())
-            & (merged_df["hash"] != merged_df["data_hash"])
-        )
-        changed_df = merged_df.loc[changed_idx.values, data_cols]  # type: ignore
+        changed_idx = ~hash_isna & ~is_deleted & hash_differs
+        changed_df = merged_df.loc[changed_idx, data_cols]  # type: ignore
 
         # Меняем мета данные для существующих записей
-        changed_meta_idx = (merged_df["hash"].notna()) & (
-            merged_df["hash"] != merged_df["data_hash"]
-        ) | (merged_df["delete_ts"].notnull())
-        changed_meta_df = merged_df.loc[merged_df["hash"].notna(), :].copy()
-
-        changed_meta_df.loc[changed_meta_idx, "update_ts"] = now
+        changed_meta_idx = (~hash_isna & hash_differs) | is_deleted
+        changed_meta_df = merged_df.loc[~hash_isna, :].copy()
+
+        # Присваиваем колонку целиком через np.where вместо частичной
+        # записи .loc[mask, col] - одна векторная запись без выравнивания
+        changed_meta_df["update_ts"] = np.where(
+            changed_meta_idx[~hash_isna],
+            now,
+            changed_meta_df["update_ts"].to_numpy(),
+        )
         changed_meta_df["process_ts"] = now
         changed_meta_df["delete_ts"] = None
         changed_meta_df["hash"] = changed_meta_df["data_hash"]
@@ -337,26 +408,60 @@ class MetaTable:
             cast(MetadataDF, changed_meta_df[meta_cols]),
         )
 
+    def _insert_chunk_size(self) -> int:
+        # Ограничиваем количество строк в одном multi-row INSERT, чтобы не
+        # упереться в лимит параметров запроса (32767 у Postgres)
+        return max(1, 30000 // len(self.sql_schema))
+
     def update_rows(self, df: MetadataDF) -> None:
         if df.empty:
             return
 
-        insert_sql = self.dbconn.insert(self.sql_table).values(
-            df.to_dict(orient="records")
-        )
+        CHUNK_SIZE = self._insert_chunk_size()
 
-        sql = insert_sql.on_conflict_do_update(
-            index_elements=self.primary_keys,
-            set_={
-                "hash": insert_sql.excluded.hash,
-                "update_ts": insert_sql.excluded.update_ts,
-                "process_ts": insert_sql.excluded.process_ts,
-                "delete_ts": insert_sql.excluded.delete_ts,
-            },
-        )
+        with self.dbconn.con.begin() as con:
+            for chunk_no in range(-(-len(df) // CHUNK_SIZE)):
+                chunk_df = df.iloc[chunk_no * CHUNK_SIZE : (chunk_no + 1) * CHUNK_SIZE]
+
+                insert_sql = self.dbconn.insert(self.sql_table).values(
+                    chunk_df.to_dict(orient="records")
+                )
+
+                sql = insert_sql.on_conflict_do_update(
+                    index_elements=self.primary_keys,
+                    set_={
+                        "hash": insert_sql.excluded.hash,
+                        "update_ts": insert_sql.excluded.update_ts,
+                        "process_ts": insert_sql.excluded.process_ts,
+                        "delete_ts": insert_sql.excluded.delete_ts,
+                    },
+                )
+
+                con.execute(sql)
+
+    def update_process_ts(self, idx: IndexDF, now: float) -> None:
+        """
+        Обновить только process_ts для строк из idx одним UPDATE - для
+        случая, когда данные не изменились и переписывать строки метаданных
+        целиком через upsert не нужно.
+        """
+
+        if len(idx) == 0:
+            return
+
+        update_sql = self.sql_table.update().values(process_ts=now)
 
         with self.dbconn.con.begin() as con:
-            con.execute(sql)
+            for chunk_idx in self._chunk_idx_df(idx):
+                sql = sql_apply_idx_filter_to_table(
+                    update_sql,
+                    self.sql_table,
+                    self.primary_keys,
+                    chunk_idx,
+                    supports_values_join=self.dbconn.supports_values_join,
+                )
+
+                con.execute(sql)
 
     def mark_rows_deleted(
         self,
@@ -367,14 +472,30 @@ class MetaTable:
             if now is None:
                 now = time.time()
 
-            meta_df = self.get_metadata(deleted_idx)
+            # Помечаем строки удаленными одним UPDATE вместо пары
+            # SELECT + upsert - меньше round trip-ов к базе
+            update_sql = (
+                self.sql_table.update()
+                .values(
+                    hash=0,
+                    delete_ts=now,
+                    update_ts=now,
+                    process_ts=now,
+                )
+                .where(self.sql_table.c.delete_ts.is_(None))
+            )
 
-            meta_df["hash"] = 0
-            meta_df["delete_ts"] = now
-            meta_df["update_ts"] = now
-            meta_df["process_ts"] = now
+            with self.dbconn.con.begin() as con:
+                for chunk_idx in self._chunk_idx_df(deleted_idx):
+                    sql = sql_apply_idx_filter_to_table(
+                        update_sql,
+                        self.sql_table,
+                        self.primary_keys,
+                        chunk_idx,
+                        supports_values_join=self.dbconn.supports_values_join,
+                    )
 
-            self.update_rows(meta_df)
+                    con.execute(sql)
 
     def get_stale_idx(
         self,
@@ -393,11 +514,16 @@ class MetaTable:
             sql, self.sql_table, self.primary_keys, run_config
         )
 
-        with self.dbconn.con.begin() as con:
-            return cast(
-                Iterator[IndexDF],
-                list(pd.read_sql_query(sql, con=con, chunksize=1000)),
-            )
+        def gen() -> Iterator[IndexDF]:
+            # Стримим индекс чанками через server-side cursor, не
+            # материализуя весь устаревший индекс в памяти
+            with self.dbconn.con.execution_options(stream_results=True).begin() as con:
+                yield from cast(
+                    Iterator[IndexDF],
+                    pd.read_sql_query(sql, con=con, chunksize=1000),
+                )
+
+        return gen()
 
     def get_changed_rows_count_after_timestamp(
         self,
@@ -439,12 +565,18 @@ class MetaTable:
         keys = [k for k in transform_keys if k in self.primary_keys]
         key_cols: List[Any] = [sa.column(k) for k in keys]
 
-        sql: Any = sa.select(
-            *key_cols + [sa.func.max(tbl.c["update_ts"]).label("update_ts")]
-        ).select_from(tbl)
+        if len(keys) == len(self.primary_keys):
+            # Ключи группировки совпадают с первичным ключом - каждая
+            # группа состоит из одной строки, max/GROUP BY не нужны и
+            # планировщик может использовать простой проход по индексу
+            sql: Any = sa.select(*key_cols + [tbl.c["update_ts"]]).select_from(tbl)
+        else:
+            sql = sa.select(
+                *key_cols + [sa.func.max(tbl.c["update_ts"]).label("update_ts")]
+            ).select_from(tbl)
 
-        if len(key_cols) > 0:
-            sql = sql.group_by(*key_cols)
+            if len(key_cols) > 0:
+                sql = sql.group_by(*key_cols)
 
         sql = sql_apply_filters_idx_to_subquery(sql, keys, filters_idx)
         sql = sql_apply_runconfig_filter(sql, tbl, self.primary_keys, run_config)
@@ -520,6 +652,36 @@ class TransformMetaTable:
         with self.dbconn.con.begin() as con:
             con.execute(sql)
 
+    def insert_rows_bulk(self, idx_iter: Iterable[IndexDF]) -> None:
+        """
+        Потоковая вставка индексов в одной транзакции. Строки передаются
+        как executemany-параметры - insertmanyvalues в sqlalchemy сам
+        склеивает их в многострочные INSERT, не компилируя отдельный
+        statement с inline VALUES на каждый чанк.
+        """
+
+        sql = self.dbconn.insert(self.sql_table).on_conflict_do_nothing(
+            index_elements=self.primary_keys
+        )
+
+        with self.dbconn.con.begin() as con:
+            for idx in idx_iter:
+                idx = cast(IndexDF, idx[self.primary_keys])
+
+                params: List[Dict[str, Any]] = [
+                    {
+                        "process_ts": 0,
+                        "is_success": False,
+                        "priority": 0,
+                        "error": None,
+                        **idx_dict,  # type: ignore
+                    }
+                    for idx_dict in idx.to_dict(orient="records")
+                ]
+
+                if params:
+                    con.execute(sql, params)
+
     def mark_rows_processed_success(
         self,
         idx: IndexDF,
@@ -754,20 +916,47 @@ def _make_agg_of_agg(
     return sql.cte(name=f"all__{agg_col}")
 
 
+def apply_changed_idx_order(
+    sql: Any,
+    transform_keys: List[str],
+    order_by: Optional[List[str]] = None,
+    order: Literal["asc", "desc"] = "asc",
+) -> Any:
+    """
+    Навесить ORDER BY на запрос из `build_changed_idx_sql`. Вынесено
+    отдельно, чтобы подсчет количества строк мог использовать запрос без
+    сортировки - базе не приходится сортировать результат ради COUNT.
+    """
+
+    if order_by is None:
+        return sql.order_by(
+            sa.column("priority").desc().nullslast(),
+            *[sa.column(k) for k in transform_keys],
+        )
+
+    if order == "desc":
+        return sql.order_by(
+            *[sa.desc(sa.column(k)) for k in order_by],
+            sa.column("priority").desc().nullslast(),
+        )
+
+    return sql.order_by(
+        *[sa.asc(sa.column(k)) for k in order_by],
+        sa.column("priority").desc().nullslast(),
+    )
+
+
 def build_changed_idx_sql(
     ds: "DataStore",
     meta_table: "TransformMetaTable",
-    input_dts: List["ComputeInput"],
+    input_dts: Sequence["ComputeInput"],
     transform_keys: List[str],
     filters_idx: Optional[IndexDF] = None,
     order_by: Optional[List[str]] = None,
     order: Literal["asc", "desc"] = "asc",
     run_config: Optional[RunConfig] = None,  # TODO remove
+    apply_order_by: bool = True,
 ) -> Tuple[Iterable[str], Any]:
-    all_input_keys_counts: Dict[str, int] = {}
-    for col in itertools.chain(*[inp.dt.primary_schema for inp in input_dts]):
-        all_input_keys_counts[col.name] = all_input_keys_counts.get(col.name, 0) + 1
-
     inp_ctes = []
     for inp in input_dts:
         keys, cte = inp.dt.meta_table.get_agg_cte(
@@ -816,6 +1005,9 @@ def build_changed_idx_sql(
                 sa.func.coalesce(agg_of_aggs.c[key], out.c[key]).label(key)
                 for key in transform_keys
             ],
+            # priority участвует в сортировке и должен быть доступен
+            # внешнему apply_changed_idx_order по имени
+            out.c.priority,
         )
         .select_from(agg_of_aggs)
         .outerjoin(
@@ -834,20 +1026,7 @@ def build_changed_idx_sql(
             )
         )
     )
-    if order_by is None:
-        sql = sql.order_by(
-            out.c.priority.desc().nullslast(),
-            *[sa.column(k) for k in transform_keys],
-        )
-    else:
-        if order == "desc":
-            sql = sql.order_by(
-                *[sa.desc(sa.column(k)) for k in order_by],
-                out.c.priority.desc().nullslast(),
-            )
-        elif order == "asc":
-            sql = sql.order_by(
-                *[sa.asc(sa.column(k)) for k in order_by],
-                out.c.priority.desc().nullslast(),
-            )
+    if apply_order_by:
+        sql = apply_changed_idx_order(sql, transform_keys, order_by=order_by, order=order)
+
     return (transform_keys, sql)
@@ -0,0 +1,23 @@
+import os
+from typing import Any, Iterable, Optional, TypeVar
+
+from tqdm_loggable.auto import tqdm
+
+T = TypeVar("T")
+
+
+def progress(
+    it: Iterable[T],
+    total: Optional[int] = None,
+    **kwargs: Any,
+) -> Iterable[T]:
+    """
+    Обернуть итератор в tqdm-прогресс. При выставленной переменной окружения
+    `DATAPIPE_NO_PROGRESS` возвращает итератор как есть - внутри сервисов и
+    воркеров отрисовка прогресса только тратит время и засоряет stderr.
+    """
+
+    if os.environ.get("DATAPIPE_NO_PROGRESS"):
+        return it
+
+    return tqdm(it, total=total, **kwargs)
@@ -1,6 +1,6 @@
 from typing import Any, Dict, List, Optional
 
-from sqlalchemy import Column, Integer, String, Table, tuple_
+from sqlalchemy import Column, Integer, String, Table, column, select, tuple_, values
 
 from datapipe.run_config import RunConfig
 from datapipe.types import IndexDF
@@ -11,20 +11,53 @@ def sql_apply_idx_filter_to_table(
     table: Table,
     primary_keys: List[str],
     idx: IndexDF,
+    supports_values_join: bool = False,
 ) -> Any:
     if len(primary_keys) == 1:
-        # Когда ключ один - сравниваем напрямую
+        # Когда ключ один - сравниваем напрямую. Дубликаты (обычные для
+        # среза по части ключей) только раздувают SQL, а отсортированный
+        # список планировщик чаще отправляет по индексу
         key = primary_keys[0]
-        sql = sql.where(table.c[key].in_(idx[key].to_list()))
+        sql = sql.where(
+            table.c[key].in_(idx[key].drop_duplicates().sort_values().to_list())
+        )
 
-    else:
-        # Когда ключей много - сравниваем по кортежу
-        keys = tuple_(*[table.c[key] for key in primary_keys])  # type: ignore
+    elif supports_values_join:
+        # Сравнение с подзапросом по VALUES-списку: Postgres планирует
+        # его как hash join, тогда как IN по списку кортежей проверяется
+        # построчно. Дубликаты убираем и сортируем заранее, чтобы отдать
+        # планировщику упорядоченный список
+        pairs = (
+            idx[primary_keys]
+            .drop_duplicates()
+            .sort_values(primary_keys)
+            .itertuples(index=False, name=None)
+        )
+
+        vals = values(
+            *[column(key, table.c[key].type) for key in primary_keys],
+            name="idx_vals",
+        ).data(list(pairs))
 
         sql = sql.where(
-            keys.in_([tuple([r[key] for key in primary_keys]) for r in idx.to_dict(orient="records")])  # type: ignore
+            tuple_(*[table.c[key] for key in primary_keys]).in_(select(vals))
         )
 
+    else:
+        # sqlite не понимает алиас с колонками у VALUES - сравниваем по
+        # кортежу; список кортежей так же дедуплицируем и сортируем
+        keys = tuple_(*[table.c[key] for key in primary_keys])  # type: ignore
+
+        rows = [
+            tuple(r[key] for key in primary_keys)
+            for r in idx[primary_keys]
+            .drop_duplicates()
+            .sort_values(primary_keys)
+            .to_dict(orient="records")
+        ]
+
+        sql = sql.where(keys.in_(rows))  # type: ignore
+
     return sql
 
 
@@ -1,20 +1,22 @@
 import inspect
 import logging
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Callable, Dict, Iterator, List, Optional
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 
 import pandas as pd
 from opentelemetry import trace
 
 from datapipe.compute import Catalog, ComputeStep, PipelineStep
 from datapipe.datatable import DataStore, DataTable
+from datapipe.executor import prefetch_iterable
 from datapipe.run_config import RunConfig
 from datapipe.step.datatable_transform import (
     DatatableTransformFunc,
     DatatableTransformStep,
 )
-from datapipe.types import Labels, TableOrName, TransformResult, cast
+from datapipe.types import DataDF, IndexDF, Labels, TableOrName, TransformResult, cast
 
 logger = logging.getLogger("datapipe.step.batch_generate")
 tracer = trace.get_tracer("datapipe.step.batch_generate")
@@ -57,32 +59,77 @@ def do_batch_generate(
 
             raise e
 
-    while True:
-        with tracer.start_as_current_span("get next batch"):
-            try:
-                chunk_dfs = next(iterable)
+    # Запись в несколько выходных таблиц можно вести параллельно - GIL
+    # отпускается на время I/O к базе. Для sqlite соединение нельзя делить
+    # между потоками, поэтому пишем последовательно.
+    pool: Optional[ThreadPoolExecutor] = None
+    if len(output_dts) > 1 and ds.meta_dbconn.supports_concurrent_writes:
+        pool = ThreadPoolExecutor(max_workers=min(len(output_dts), 8))
 
-                if isinstance(chunk_dfs, pd.DataFrame):
-                    chunk_dfs = (chunk_dfs,)
-            except StopIteration:
-                break
-            except Exception as e:
-                logger.exception(f"Generating failed ({func}): {str(e)}")
-                ds.event_logger.log_exception(e, run_config=run_config)
-
-                # raise e
-                return
+    generation_failed = False
 
-        empty_generator = False
+    def chunks_iter() -> Iterator[Tuple[DataDF, ...]]:
+        # Перехватываем ошибки генерации и нормализуем результат один раз,
+        # без try/except на каждой итерации основного цикла
+        nonlocal generation_failed
 
-        with tracer.start_as_current_span("store results"):
-            for k, dt_k in enumerate(output_dts):
-                dt_k.store_chunk(chunk_dfs[k], run_config=run_config)
+        try:
+            for chunk_dfs in iterable:
+                if isinstance(chunk_dfs, pd.DataFrame):
+                    yield (chunk_dfs,)
+                else:
+                    yield tuple(chunk_dfs)
+        except Exception as e:
+            logger.exception(f"Generating failed ({func}): {str(e)}")
+            ds.event_logger.log_exception(e, run_config=run_config)
 
-    if delete_stale:
-        with tracer.start_as_current_span("delete stale rows"):
-            for k, dt_k in enumerate(output_dts):
-                dt_k.delete_stale_by_process_ts(now, run_config=run_config)
+            generation_failed = True
+
+    chunks: Iterator[Tuple[DataDF, ...]] = chunks_iter()
+
+    # Генерируем следующий батч, пока пишется текущий
+    if ds.meta_dbconn.supports_concurrent_writes:
+        chunks = prefetch_iterable(chunks)
+
+    try:
+        for chunk_dfs in chunks:
+            empty_generator = False
+
+            with tracer.start_as_current_span("store results"):
+                if pool is not None:
+                    store_futures: List["Future[IndexDF]"] = [
+                        pool.submit(dt_k.store_chunk, chunk_dfs[k], run_config=run_config)
+                        for k, dt_k in enumerate(output_dts)
+                    ]
+                    for future in store_futures:
+                        future.result()
+                else:
+                    for k, dt_k in enumerate(output_dts):
+                        dt_k.store_chunk(chunk_dfs[k], run_config=run_config)
+        if generation_failed:
+            return
+
+        if delete_stale:
+            with tracer.start_as_current_span("delete stale rows"):
+                # Удаление устаревших строк в разных таблицах независимо -
+                # используем тот же пул, что и для записи
+                if pool is not None:
+                    delete_futures: List["Future[None]"] = [
+                        pool.submit(
+                            dt_k.delete_stale_by_process_ts,
+                            now,
+                            run_config=run_config,
+                        )
+                        for dt_k in output_dts
+                    ]
+                    for delete_future in delete_futures:
+                        delete_future.result()
+                else:
+                    for dt_k in output_dts:
+                        dt_k.delete_stale_by_process_ts(now, run_config=run_config)
+    finally:
+        if pool is not None:
+            pool.shutdown()
 
 
 @dataclass
@@ -94,6 +141,12 @@ class BatchGenerate(PipelineStep):
     delete_stale: bool = True
 
     def build_compute(self, ds: DataStore, catalog: Catalog) -> List[ComputeStep]:
+        # Свойство функции фиксировано - проверяем один раз при построении
+        # шага, а не на каждый запуск do_batch_generate
+        assert inspect.isgeneratorfunction(
+            self.func
+        ), "Starting v0.8.0 proc_func should be a generator"
+
         return [
             DatatableTransformStep(
                 name=self.func.__name__,
@@ -109,7 +162,7 @@ class BatchGenerate(PipelineStep):
                     ),
                 ),
                 input_dts=[],
-                output_dts=[catalog.get_datatable(ds, name) for name in self.outputs],
+                output_dts=catalog.get_datatables(ds, self.outputs),
                 check_for_changes=False,
                 kwargs=self.kwargs,
                 labels=self.labels,
@@ -1,9 +1,8 @@
-import copy
 import inspect
 import itertools
 import logging
-import math
 import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from typing import (
     Any,
@@ -19,11 +18,11 @@ from typing import (
     cast,
 )
 
+import numpy as np
 import pandas as pd
 from opentelemetry import trace
 from sqlalchemy import alias, func, select
 from sqlalchemy.sql.expression import select
-from tqdm_loggable.auto import tqdm
 
 from datapipe.compute import (
     Catalog,
@@ -33,9 +32,20 @@ from datapipe.compute import (
     StepStatus,
 )
 from datapipe.datatable import DataStore, DataTable, MetaTable
-from datapipe.executor import Executor, ExecutorConfig, SingleThreadExecutor
-from datapipe.meta.sql_meta import TransformMetaTable, build_changed_idx_sql
+from datapipe.executor import (
+    Executor,
+    ExecutorConfig,
+    SingleThreadExecutor,
+    prefetch_iterable,
+)
+from datapipe.meta.sql_meta import (
+    TransformMetaTable,
+    apply_changed_idx_order,
+    build_changed_idx_sql,
+)
+from datapipe.progress import progress
 from datapipe.run_config import LabelDict, RunConfig
+from datapipe.tracing import maybe_span
 from datapipe.types import (
     ChangeList,
     DataDF,
@@ -121,6 +131,16 @@ class BaseBatchTransformStep(ComputeStep):
         self.order_by = order_by
         self.order = order
 
+        # Специализация по количеству выходов известна при построении шага
+        self._single_output = len(output_dts) == 1
+
+        # Метка step_name статична - не собираем словарь на каждый запуск
+        self._step_labels: LabelDict = {"step_name": self.name}
+
+        # Построенное дерево запроса для случая без фильтров - оно зависит
+        # только от шага, см. _changed_idx_sql
+        self._changed_idx_sql_cache: Optional[Tuple[Iterable[str], Any]] = None
+
     @classmethod
     def compute_transform_schema(
         cls,
@@ -133,11 +153,8 @@ class BaseBatchTransformStep(ComputeStep):
         # same key is defined differently in different input tables.
         all_keys = {
             col.name: col
-            for col in itertools.chain(
-                *(
-                    [dt.primary_schema for dt in input_mts]
-                    + [dt.primary_schema for dt in output_mts]
-                )
+            for col in itertools.chain.from_iterable(
+                dt.primary_schema for dt in itertools.chain(input_mts, output_mts)
             )
         }
 
@@ -146,19 +163,27 @@ class BaseBatchTransformStep(ComputeStep):
 
         assert len(input_mts) > 0
 
-        inp_p_keys = set.intersection(*[set(inp.primary_keys) for inp in input_mts])
+        # Пересечение считаем в порядке ключей первой таблицы -
+        # list(set(...)) давал недетерминированный порядок transform_keys
+        # и, как следствие, нестабильный текст SQL от запуска к запуску
+        inp_key_sets = [set(inp.primary_keys) for inp in input_mts[1:]]
+        inp_p_keys = [
+            k
+            for k in input_mts[0].primary_keys
+            if all(k in keys for keys in inp_key_sets)
+        ]
         assert len(inp_p_keys) > 0
 
         if len(output_mts) == 0:
-            return (list(inp_p_keys), [all_keys[k] for k in inp_p_keys])
+            return (inp_p_keys, [all_keys[k] for k in inp_p_keys])
 
         out_p_keys = set.intersection(*[set(out.primary_keys) for out in output_mts])
         assert len(out_p_keys) > 0
 
-        inp_out_p_keys = set.intersection(inp_p_keys, out_p_keys)
+        inp_out_p_keys = [k for k in inp_p_keys if k in out_p_keys]
         assert len(inp_out_p_keys) > 0
 
-        return (list(inp_out_p_keys), [all_keys[k] for k in inp_out_p_keys])
+        return (inp_out_p_keys, [all_keys[k] for k in inp_out_p_keys])
 
     def _apply_filters_to_run_config(
         self, run_config: Optional[RunConfig] = None
@@ -174,11 +199,48 @@ class BaseBatchTransformStep(ComputeStep):
             if run_config is None:
                 return RunConfig(filters=filters)
             else:
-                run_config = copy.deepcopy(run_config)
-                filters = copy.deepcopy(filters)
-                filters.update(run_config.filters)
-                run_config.filters = filters
-                return run_config
+                # filters - плоский словарь, достаточно поверхностного
+                # слияния без дорогого deepcopy на каждый батч
+                return RunConfig(
+                    filters={**filters, **run_config.filters},
+                    labels=run_config.labels,
+                )
+
+    def _changed_idx_sql(
+        self,
+        ds: DataStore,
+        filters_idx: Optional[IndexDF] = None,
+        run_config: Optional[RunConfig] = None,
+    ) -> Tuple[Iterable[str], Any]:
+        """
+        Запрос изменившихся индексов без ORDER BY. Для стабильного случая
+        (нет фильтров) дерево выражения зависит только от шага, поэтому
+        строим его один раз и переиспользуем - повторное использование
+        одного объекта также дает стабильные попадания в compiled cache
+        sqlalchemy.
+        """
+
+        cacheable = filters_idx is None and (
+            run_config is None or not run_config.filters
+        )
+
+        if cacheable and self._changed_idx_sql_cache is not None:
+            return self._changed_idx_sql_cache
+
+        res = build_changed_idx_sql(
+            ds=ds,
+            meta_table=self.meta_table,
+            input_dts=self.input_dts,
+            transform_keys=self.transform_keys,
+            filters_idx=filters_idx,
+            run_config=run_config,
+            apply_order_by=False,
+        )
+
+        if cacheable:
+            self._changed_idx_sql_cache = res
+
+        return res
 
     def get_status(self, ds: DataStore) -> StepStatus:
         return StepStatus(
@@ -193,13 +255,9 @@ class BaseBatchTransformStep(ComputeStep):
         run_config: Optional[RunConfig] = None,
     ) -> int:
         run_config = self._apply_filters_to_run_config(run_config)
-        _, sql = build_changed_idx_sql(
-            ds=ds,
-            meta_table=self.meta_table,
-            input_dts=self.input_dts,
-            transform_keys=self.transform_keys,
-            run_config=run_config,
-        )
+        # Для COUNT сортировка не нужна - не заставляем базу сортировать
+        # весь результат
+        _, sql = self._changed_idx_sql(ds=ds, run_config=run_config)
 
         with ds.meta_dbconn.con.begin() as con:
             idx_count = con.execute(
@@ -231,17 +289,25 @@ class BaseBatchTransformStep(ComputeStep):
             if len(self.input_dts) == 0:
                 return (0, iter([]))
 
-            idx_count = self.get_changed_idx_count(
-                ds=ds,
-                run_config=run_config,
-            )
+            # Строим CTE-дерево один раз и используем его и для подсчета, и
+            # для итерации - раньше get_changed_idx_count собирал такое же
+            # дерево заново. Считаем по версии без ORDER BY, сортировка
+            # нужна только при итерации.
+            join_keys, base_sql = self._changed_idx_sql(ds=ds, run_config=run_config)
+
+            with ds.meta_dbconn.con.begin() as con:
+                idx_count = cast(
+                    int,
+                    con.execute(
+                        select(*[func.count()]).select_from(
+                            alias(base_sql.subquery(), name="union_select")
+                        )
+                    ).scalar(),
+                )
 
-            join_keys, u1 = build_changed_idx_sql(
-                ds=ds,
-                meta_table=self.meta_table,
-                input_dts=self.input_dts,
-                transform_keys=self.transform_keys,
-                run_config=run_config,
+            u1 = apply_changed_idx_order(
+                base_sql,
+                self.transform_keys,
                 order_by=self.order_by,
                 order=self.order,  # type: ignore  # pylance is stupid
             )
@@ -256,16 +322,29 @@ class BaseBatchTransformStep(ComputeStep):
                 extra_filters = {}
 
             def alter_res_df():
-                with ds.meta_dbconn.con.begin() as con:
-                    for df in pd.read_sql_query(u1, con=con, chunksize=chunk_size):
+                # Читаем индекс через server-side cursor и собираем чанки
+                # напрямую из строк результата - без row-процессинга
+                # pd.read_sql_query, здесь всего несколько ключевых колонок
+                with ds.meta_dbconn.con.execution_options(
+                    stream_results=True
+                ).begin() as con:
+                    result = con.execute(u1)
+                    columns = list(result.keys())
+
+                    for rows in result.partitions(chunk_size):
+                        df = pd.DataFrame(rows, columns=columns)
                         df = df[self.transform_keys]
 
-                        for k, v in extra_filters.items():
-                            df[k] = v
+                        if extra_filters:
+                            # Одно присваивание вместо вставки колонок по
+                            # одной - assign добавляет все константы за
+                            # одну пересборку блоков
+                            df = df.assign(**extra_filters)
 
                         yield cast(IndexDF, df)
 
-            return math.ceil(idx_count / chunk_size), alter_res_df()
+            # Целочисленное деление с округлением вверх - без float
+            return -(-idx_count // chunk_size), alter_res_df()
 
     def get_change_list_process_ids(
         self,
@@ -273,9 +352,14 @@ class BaseBatchTransformStep(ComputeStep):
         change_list: ChangeList,
         run_config: Optional[RunConfig] = None,
     ) -> Tuple[int, Iterable[IndexDF]]:
+        # Если изменения не затрагивают входы шага - выходим до создания
+        # span-а и слияния фильтров
+        if not any(inp.dt.name in change_list.changes for inp in self.input_dts):
+            return 0, iter([])
+
         run_config = self._apply_filters_to_run_config(run_config)
         with tracer.start_as_current_span("compute ids to process"):
-            changes = [pd.DataFrame(columns=self.transform_keys)]
+            changes = []
 
             for inp in self.input_dts:
                 if inp.dt.name in change_list.changes:
@@ -284,11 +368,8 @@ class BaseBatchTransformStep(ComputeStep):
                         # TODO пересмотреть эту логику, выглядит избыточной
                         # (возможно, достаточно посчитать один раз для всех
                         # input таблиц)
-                        _, sql = build_changed_idx_sql(
+                        _, sql = self._changed_idx_sql(
                             ds=ds,
-                            meta_table=self.meta_table,
-                            input_dts=self.input_dts,
-                            transform_keys=self.transform_keys,
                             filters_idx=idx,
                             run_config=run_config,
                         )
@@ -303,16 +384,38 @@ class BaseBatchTransformStep(ComputeStep):
                     else:
                         changes.append(data_to_index(idx, self.transform_keys))
 
-            idx_df = pd.concat(changes).drop_duplicates(subset=self.transform_keys)
-            idx = IndexDF(idx_df[self.transform_keys])
+            if not changes:
+                return 0, iter([])
+
+            # Один concat + dedup вместо вызова на каждую таблицу;
+            # ignore_index снимает расходы на пересборку индекса строк
+            idx_df = (
+                changes[0]
+                if len(changes) == 1
+                else pd.concat(changes, ignore_index=True)
+            )
+            idx_df = idx_df[self.transform_keys]
+
+            if all(
+                pd.api.types.is_integer_dtype(dtype) for dtype in idx_df.dtypes
+            ):
+                # Для целочисленных ключей дедупликация по ndarray быстрее
+                # хэширования кортежей в drop_duplicates; порядок строк
+                # здесь не важен
+                arr = np.unique(idx_df.to_numpy(), axis=0)
+                idx_df = pd.DataFrame(arr, columns=self.transform_keys)
+            else:
+                idx_df = idx_df.drop_duplicates(ignore_index=True)
+
+            idx = IndexDF(idx_df)
 
-            chunk_count = math.ceil(len(idx) / self.chunk_size)
+            idx_len = len(idx)
+            chunk_count = -(-idx_len // self.chunk_size)
 
             def gen():
-                for i in range(chunk_count):
-                    yield cast(
-                        IndexDF, idx[i * self.chunk_size : (i + 1) * self.chunk_size]
-                    )
+                # iloc по срезу не перестраивает индекс строк
+                for start in range(0, idx_len, self.chunk_size):
+                    yield cast(IndexDF, idx.iloc[start : start + self.chunk_size])
 
             return chunk_count, gen()
 
@@ -326,42 +429,61 @@ class BaseBatchTransformStep(ComputeStep):
     ) -> ChangeList:
         run_config = self._apply_filters_to_run_config(run_config)
 
-        changes = ChangeList()
+        # Выходные таблицы шага уникальны - собираем изменения в словарь и
+        # строим ChangeList одним присваиванием
+        change_map: Dict[str, IndexDF] = {}
 
         if output_dfs is not None:
-            with tracer.start_as_current_span("store output batch"):
-                if isinstance(output_dfs, (list, tuple)):
-                    assert len(output_dfs) == len(self.output_dts)
+            with maybe_span(tracer, "store output batch"):
+                if self._single_output:
+                    # Типичный случай - одна выходная таблица; пишем чанк
+                    # напрямую, без сборки списка пар и dispatch-а
+                    if isinstance(output_dfs, (list, tuple)):
+                        assert len(output_dfs) == 1
+                        (output_dfs,) = output_dfs
+
+                    res_dt = self.output_dts[0]
+                    change_idx = res_dt.store_chunk(
+                        data_df=output_dfs,
+                        processed_idx=idx,
+                        now=process_ts,
+                        run_config=run_config,
+                    )
+
+                    change_map[res_dt.name] = change_idx
                 else:
-                    assert len(self.output_dts) == 1
-                    output_dfs = [output_dfs]
+                    assert isinstance(output_dfs, (list, tuple))
+                    assert len(output_dfs) == len(self.output_dts)
 
-                for k, res_dt in enumerate(self.output_dts):
                     # Берем k-ое значение функции для k-ой таблички
-                    # Добавляем результат в результирующие чанки
-                    change_idx = res_dt.store_chunk(
-                        data_df=output_dfs[k],
+                    change_idxs = ds.store_chunks_batch(
+                        [
+                            (res_dt, output_dfs[k])
+                            for k, res_dt in enumerate(self.output_dts)
+                        ],
                         processed_idx=idx,
                         now=process_ts,
                         run_config=run_config,
                     )
 
-                    changes.append(res_dt.name, change_idx)
+                    # Добавляем результат в результирующие чанки
+                    for res_dt, change_idx in zip(self.output_dts, change_idxs):
+                        change_map[res_dt.name] = change_idx
 
         else:
-            with tracer.start_as_current_span("delete missing data from output"):
+            with maybe_span(tracer, "delete missing data from output"):
                 for k, res_dt in enumerate(self.output_dts):
                     del_idx = res_dt.meta_table.get_existing_idx(idx)
 
                     res_dt.delete_by_idx(del_idx, run_config=run_config)
 
-                    changes.append(res_dt.name, del_idx)
+                    change_map[res_dt.name] = del_idx
 
         self.meta_table.mark_rows_processed_success(
             idx, process_ts=process_ts, run_config=run_config
         )
 
-        return changes
+        return ChangeList.from_dict(change_map)
 
     def store_batch_err(
         self,
@@ -396,8 +518,11 @@ class BaseBatchTransformStep(ComputeStep):
     def fill_metadata(self, ds: DataStore) -> None:
         idx_len, idx_gen = self.get_full_process_ids(ds=ds, chunk_size=1000)
 
-        for idx in tqdm(idx_gen, total=idx_len):
-            self.meta_table.insert_rows(idx)
+        # Читаем следующий чанк индексов, пока вставляется текущий
+        if ds.meta_dbconn.supports_concurrent_writes:
+            idx_gen = prefetch_iterable(idx_gen)
+
+        self.meta_table.insert_rows_bulk(progress(idx_gen, total=idx_len))
 
     def reset_metadata(self, ds: DataStore) -> None:
         self.meta_table.mark_all_rows_unprocessed()
@@ -408,6 +533,18 @@ class BaseBatchTransformStep(ComputeStep):
         idx: IndexDF,
         run_config: Optional[RunConfig] = None,
     ) -> List[DataDF]:
+        # Входы независимы - читаем их параллельно, суммарное время
+        # получения батча сжимается с суммы до максимума по входам. Для
+        # sqlite соединение нельзя делить между потоками - читаем
+        # последовательно.
+        if len(self.input_dts) > 1 and ds.meta_dbconn.supports_concurrent_writes:
+            with ThreadPoolExecutor(max_workers=len(self.input_dts)) as pool:
+                futures = [
+                    pool.submit(inp.dt.get_data, idx) for inp in self.input_dts
+                ]
+
+                return [future.result() for future in futures]
+
         return [inp.dt.get_data(idx) for inp in self.input_dts]
 
     def process_batch_dfs(
@@ -425,13 +562,13 @@ class BaseBatchTransformStep(ComputeStep):
         idx: IndexDF,
         run_config: Optional[RunConfig] = None,
     ) -> Optional[TransformResult]:
-        with tracer.start_as_current_span("get input data"):
+        with maybe_span(tracer, "get input data"):
             input_dfs = self.get_batch_input_dfs(ds, idx, run_config)
 
-        if sum(len(j) for j in input_dfs) == 0:
+        if not any(len(df) > 0 for df in input_dfs):
             return None
 
-        with tracer.start_as_current_span("run transform"):
+        with maybe_span(tracer, "run transform"):
             output_dfs = self.process_batch_dfs(
                 ds=ds,
                 idx=idx,
@@ -447,8 +584,11 @@ class BaseBatchTransformStep(ComputeStep):
         idx: IndexDF,
         run_config: Optional[RunConfig] = None,
     ) -> ChangeList:
-        with tracer.start_as_current_span("process batch"):
-            logger.debug(f"Idx to process: {idx.to_records()}")
+        with maybe_span(tracer, "process batch"):
+            # to_records() материализует индекс целиком - не делаем этого,
+            # когда DEBUG-лог выключен
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Idx to process: {idx.to_records()}")
 
             process_ts = time.time()
 
@@ -474,7 +614,7 @@ class BaseBatchTransformStep(ComputeStep):
             executor = SingleThreadExecutor()
 
         logger.info(f"Running: {self.name}")
-        run_config = RunConfig.add_labels(run_config, {"step_name": self.name})
+        run_config = RunConfig.add_labels(run_config, self._step_labels)
 
         (idx_count, idx_gen) = self.get_full_process_ids(ds=ds, run_config=run_config)
 
@@ -505,7 +645,7 @@ class BaseBatchTransformStep(ComputeStep):
         if executor is None:
             executor = SingleThreadExecutor()
 
-        run_config = RunConfig.add_labels(run_config, {"step_name": self.name})
+        run_config = RunConfig.add_labels(run_config, self._step_labels)
 
         (idx_count, idx_gen) = self.get_change_list_process_ids(
             ds, change_list, run_config
@@ -541,7 +681,7 @@ class BaseBatchTransformStep(ComputeStep):
             executor = SingleThreadExecutor()
 
         logger.info(f"Running: {self.name}")
-        run_config = RunConfig.add_labels(run_config, {"step_name": self.name})
+        run_config = RunConfig.add_labels(run_config, self._step_labels)
 
         return self.process_batch(
             ds=ds,
@@ -561,8 +701,8 @@ class DatatableBatchTransform(PipelineStep):
     labels: Optional[Labels] = None
 
     def build_compute(self, ds: DataStore, catalog: Catalog) -> List[ComputeStep]:
-        input_dts = [catalog.get_datatable(ds, name) for name in self.inputs]
-        output_dts = [catalog.get_datatable(ds, name) for name in self.outputs]
+        input_dts = catalog.get_datatables(ds, self.inputs)
+        output_dts = catalog.get_datatables(ds, self.outputs)
 
         return [
             DatatableBatchTransformStep(
@@ -656,7 +796,7 @@ class BatchTransform(PipelineStep):
             self.pipeline_input_to_compute_input(ds, catalog, input)
             for input in self.inputs
         ]
-        output_dts = [catalog.get_datatable(ds, name) for name in self.outputs]
+        output_dts = catalog.get_datatables(ds, self.outputs)
 
         return [
             BatchTransformStep(
@@ -712,19 +852,25 @@ class BatchTransformStep(BaseBatchTransformStep):
         self.kwargs = kwargs
         self.parameters = inspect.signature(self.func).parameters
 
+        # Проверки сигнатуры выполняются на каждый батч - считаем их один
+        # раз при построении шага
+        self._func_accepts_ds = "ds" in self.parameters
+        self._func_accepts_idx = "idx" in self.parameters
+        self._func_accepts_run_config = "run_config" in self.parameters
+
     def process_batch_dts(
         self,
         ds: DataStore,
         idx: IndexDF,
         run_config: Optional[RunConfig] = None,
     ) -> Optional[TransformResult]:
-        with tracer.start_as_current_span("get input data"):
+        with maybe_span(tracer, "get input data"):
             input_dfs = self.get_batch_input_dfs(ds, idx, run_config)
 
-        if "idx" not in self.parameters and sum(len(j) for j in input_dfs) == 0:
+        if not self._func_accepts_idx and not any(len(df) > 0 for df in input_dfs):
             return None
 
-        with tracer.start_as_current_span("run transform"):
+        with maybe_span(tracer, "run transform"):
             output_dfs = self.process_batch_dfs(
                 ds=ds,
                 idx=idx,
@@ -742,9 +888,9 @@ class BatchTransformStep(BaseBatchTransformStep):
         run_config: Optional[RunConfig] = None,
     ) -> TransformResult:
         kwargs = {
-            **({"ds": ds} if "ds" in self.parameters else {}),
-            **({"idx": idx} if "idx" in self.parameters else {}),
-            **({"run_config": run_config} if "run_config" in self.parameters else {}),
+            **({"ds": ds} if self._func_accepts_ds else {}),
+            **({"idx": idx} if self._func_accepts_idx else {}),
+            **({"run_config": run_config} if self._func_accepts_run_config else {}),
             **(self.kwargs or {}),
         }
         return self.func(*input_dfs, **kwargs)
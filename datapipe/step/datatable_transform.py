@@ -1,6 +1,6 @@
 import logging
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional, Protocol
+from typing import Any, Dict, List, Optional, Protocol, Sequence
 
 from opentelemetry import trace
 
@@ -20,8 +20,8 @@ class DatatableTransformFunc(Protocol):
     def __call__(
         self,
         ds: DataStore,
-        input_dts: List[DataTable],
-        output_dts: List[DataTable],
+        input_dts: Sequence[DataTable],
+        output_dts: Sequence[DataTable],
         run_config: Optional[RunConfig],
         kwargs: Optional[Dict[str, Any]] = None,
     ) -> None: ...
@@ -44,6 +44,9 @@ class DatatableTransformStep(ComputeStep):
         self.kwargs = kwargs or {}
         self.check_for_changes = check_for_changes
 
+        # Метка step_name статична - не собираем словарь на каждый запуск
+        self._step_labels = {"step_name": self.get_name()}
+
     def run_full(
         self,
         ds: DataStore,
@@ -69,7 +72,7 @@ class DatatableTransformStep(ComputeStep):
 
         #             return
 
-        run_config = RunConfig.add_labels(run_config, {"step_name": self.get_name()})
+        run_config = RunConfig.add_labels(run_config, self._step_labels)
 
         with tracer.start_as_current_span(f"Run {self.func}"):
             try:
@@ -101,10 +104,10 @@ class DatatableTransform(PipelineStep):
             DatatableTransformStep(
                 name=self.func.__name__,
                 input_dts=[
-                    ComputeInput(dt=catalog.get_datatable(ds, i), join_type="full")
-                    for i in self.inputs
+                    ComputeInput(dt=dt, join_type="full")
+                    for dt in catalog.get_datatables(ds, self.inputs)
                 ],
-                output_dts=[catalog.get_datatable(ds, i) for i in self.outputs],
+                output_dts=catalog.get_datatables(ds, self.outputs),
                 func=self.func,
                 kwargs=self.kwargs,
                 check_for_changes=self.check_for_changes,
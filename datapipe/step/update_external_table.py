@@ -3,10 +3,10 @@ import time
 from typing import List, Optional
 
 import pandas as pd
-from tqdm_loggable.auto import tqdm
 
 from datapipe.compute import Catalog, ComputeStep, PipelineStep
 from datapipe.datatable import DataStore, DataTable
+from datapipe.progress import progress
 from datapipe.run_config import RunConfig
 from datapipe.step.datatable_transform import (
     DatatableTransformFunc,
@@ -22,7 +22,7 @@ def update_external_table(
 ) -> None:
     now = time.time()
 
-    for ps_df in tqdm(
+    for ps_df in progress(
         table.table_store.read_rows_meta_pseudo_df(run_config=run_config)
     ):
         (
@@ -1,4 +1,5 @@
 import copy
+import io
 import logging
 import math
 from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union, cast
@@ -6,7 +7,7 @@ from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union,
 import numpy as np
 import pandas as pd
 from opentelemetry import trace
-from sqlalchemy import Column, MetaData, Table, create_engine, func, text
+from sqlalchemy import Column, MetaData, Table, create_engine, event, func
 from sqlalchemy.pool import QueuePool, SingletonThreadPool
 from sqlalchemy.schema import SchemaItem
 from sqlalchemy.sql.base import SchemaEventTarget
@@ -48,6 +49,14 @@ class DBConn:
         if connstr.startswith("sqlite") or connstr.startswith("pysqlite"):
             self.supports_update_from = False
 
+            # SingletonThreadPool держит по соединению на поток (для
+            # :memory: это отдельные базы), поэтому писать из нескольких
+            # потоков в sqlite нельзя
+            self.supports_concurrent_writes = False
+
+            # sqlite не поддерживает алиас с именами колонок у VALUES
+            self.supports_values_join = False
+
             from sqlalchemy.dialects.sqlite import insert
 
             self.insert = insert
@@ -61,25 +70,45 @@ class DBConn:
 
             # WAL mode is required for concurrent reads and writes
             # https://www.sqlite.org/wal.html
-            with self.con.begin() as con:
-                con.execute(text("PRAGMA journal_mode=WAL"))
+            #
+            # synchronous=NORMAL в связке с WAL не ждет fsync на каждый
+            # коммит, что сильно ускоряет батчевые вставки и безопасно от
+            # повреждения базы.
+            #
+            # PRAGMA применяем через connect-событие: SingletonThreadPool
+            # открывает отдельное соединение на поток, и настройки должны
+            # попасть в каждое из них, а не только в первое
+            @event.listens_for(self.con, "connect")
+            def _set_sqlite_pragmas(dbapi_conn: Any, _: Any) -> None:
+                cursor = dbapi_conn.cursor()
+                cursor.execute("PRAGMA journal_mode=WAL")
+                cursor.execute("PRAGMA synchronous=NORMAL")
+                cursor.close()
         else:
             # Assume relatively new Postgres
             self.supports_update_from = True
+            self.supports_concurrent_writes = True
+            self.supports_values_join = True
 
             from sqlalchemy.dialects.postgresql import insert as pg_insert
 
             self.insert = pg_insert
             self.func_greatest = func.greatest
 
-            self.con = create_engine(
-                connstr,
+            # Дефолтный размер пула (5 соединений) становится узким местом
+            # при параллельных шагах; явные значения можно переопределить
+            # через create_engine_kwargs
+            engine_kwargs: Dict[str, Any] = dict(
                 poolclass=QueuePool,
+                pool_size=25,
+                max_overflow=10,
+                pool_timeout=30,
                 pool_pre_ping=True,
                 pool_recycle=3600,
-                **create_engine_kwargs,
-                # pool_size=25,
             )
+            engine_kwargs.update(create_engine_kwargs)
+
+            self.con = create_engine(connstr, **engine_kwargs)
 
         if sqla_metadata is None:
             self.sqla_metadata = MetaData(schema=schema)
@@ -128,7 +157,10 @@ class TableStoreDB(TableStore):
         data_sql_schema: Optional[List[Column]] = None,
         create_table: bool = False,
         orm_table: Optional[OrmTable] = None,
+        use_copy: bool = False,
     ) -> None:
+        self.use_copy = use_copy
+
         if isinstance(dbconn, str):
             self.dbconn = DBConn(dbconn)
         else:
@@ -186,6 +218,22 @@ class TableStoreDB(TableStore):
         if create_table:
             self.data_table.create(self.dbconn.con, checkfirst=True)
 
+        # Схема фиксирована - производные от нее значения и upsert-
+        # statement собираем один раз, а не при каждом вызове
+        self._pk_names = [c.name for c in self.data_sql_schema if c.primary_key]
+        self._chunk_sz = 5000 // len(self._pk_names)
+
+        insert_sql = self.dbconn.insert(self.data_table)
+        if len(self.data_keys) > 0:
+            self._upsert_sql = insert_sql.on_conflict_do_update(
+                index_elements=self._pk_names,
+                set_={name: insert_sql.excluded[name] for name in self.data_keys},
+            )
+        else:
+            self._upsert_sql = insert_sql.on_conflict_do_nothing(
+                index_elements=self._pk_names
+            )
+
     def __reduce__(self) -> Tuple[Any, ...]:
         return self.__class__, (
             self.dbconn,
@@ -210,7 +258,7 @@ class TableStoreDB(TableStore):
         # https://github.com/epoch8/datapipe/issues/178 for details.
         #
         # TODO Investigate deeper how does stack in Postgres work
-        return 5000 // len(self.primary_keys)
+        return self._chunk_sz
 
     def _chunk_idx_df(self, idx: TAnyDF) -> Iterator[TAnyDF]:
         """
@@ -231,39 +279,78 @@ class TableStoreDB(TableStore):
 
         logger.debug(f"Deleting {len(idx.index)} rows from {self.name} data")
 
-        for chunk_idx in self._chunk_idx_df(idx):
-            sql = sql_apply_idx_filter_to_table(
-                delete(self.data_table), self.data_table, self.primary_keys, chunk_idx
-            )
-            with self.dbconn.con.begin() as con:
+        # Одна транзакция на все чанки - не платим commit/fsync за каждый
+        with self.dbconn.con.begin() as con:
+            for chunk_idx in self._chunk_idx_df(idx):
+                sql = sql_apply_idx_filter_to_table(
+                    delete(self.data_table),
+                    self.data_table,
+                    self._pk_names,
+                    chunk_idx,
+                    supports_values_join=self.dbconn.supports_values_join,
+                )
                 con.execute(sql)
 
     def insert_rows(self, df: DataDF) -> None:
-        self.update_rows(df)
+        # insert_rows вызывается метаслоем только для заведомо новых строк,
+        # поэтому при use_copy конфликтов по ключам быть не может
+        if self.use_copy:
+            self._insert_rows_copy(df)
+        else:
+            self.update_rows(df)
+
+    def _insert_rows_copy(self, df: DataDF) -> None:
+        """
+        Быстрый путь для чистой вставки, когда вызывающий знает, что
+        конфликтов по ключам не будет (например, первичная загрузка).
+
+        На Postgres использует COPY FROM STDIN - минуя разбор SQL и
+        пострадную обработку INSERT ... ON CONFLICT. На остальных базах
+        сваливается в обычный executemany-путь update_rows.
+        """
+
+        if df.empty:
+            return
+
+        if self.dbconn.con.dialect.name != "postgresql":
+            self.update_rows(df)
+            return
+
+        columns = [column.name for column in self.data_sql_schema]
+
+        buf = io.StringIO()
+        df[columns].to_csv(buf, index=False, header=False, sep="\t", na_rep="\\N")
+        buf.seek(0)
+
+        preparer = self.dbconn.con.dialect.identifier_preparer
+        copy_sql = (
+            f"COPY {preparer.format_table(self.data_table)} "
+            f"({', '.join(preparer.quote(name) for name in columns)}) "
+            "FROM STDIN WITH (FORMAT csv, DELIMITER E'\\t', NULL '\\N')"
+        )
+
+        with self.dbconn.con.begin() as con:
+            cursor = con.connection.cursor()
+            try:
+                cursor.copy_expert(copy_sql, buf)
+            finally:
+                cursor.close()
 
     def update_rows(self, df: DataDF) -> None:
         if df.empty:
             return
 
         # TODO разобраться, нужен ли этот блок кода, написать тесты на заполнение None/NULL
-        insert_sql = self.dbconn.insert(self.data_table).values(
-            df.fillna(np.nan).replace({np.nan: None}).to_dict(orient="records")
+        records = cast(
+            List[Dict[str, Any]],
+            df.fillna(np.nan).replace({np.nan: None}).to_dict(orient="records"),
         )
 
-        if len(self.data_keys) > 0:
-            sql = insert_sql.on_conflict_do_update(
-                index_elements=self.primary_keys,
-                set_={
-                    col.name: insert_sql.excluded[col.name]
-                    for col in self.data_sql_schema
-                    if not col.primary_key
-                },
-            )
-        else:
-            sql = insert_sql.on_conflict_do_nothing(index_elements=self.primary_keys)
-
+        # Строки уходят как executemany-параметры: insertmanyvalues сам
+        # нарезает их на батчи вместо компиляции одного гигантского
+        # INSERT с inline VALUES на весь датафрейм
         with self.dbconn.con.begin() as con:
-            con.execute(sql)
+            con.execute(self._upsert_sql, records)
 
     # Fix numpy types in IndexDF
     def _get_sql_param(self, param):
@@ -279,18 +366,26 @@ class TableStoreDB(TableStore):
                     columns=[column.name for column in self.data_sql_schema]
                 )
 
-            res = []
+            columns = [column.name for column in self.data_sql_schema]
+            rows: List[Any] = []
 
-            with self.dbconn.con.begin() as con:
+            # Все чанки читаем в одном соединении server-side курсором и
+            # собираем единый DataFrame из строк - без DataFrame на каждый
+            # чанк и финального concat с копированием буферов
+            with self.dbconn.con.execution_options(
+                stream_results=True
+            ).begin() as con:
                 for chunk_idx in self._chunk_idx_df(idx):
                     chunk_sql = sql_apply_idx_filter_to_table(
-                        sql, self.data_table, self.primary_keys, chunk_idx
+                        sql,
+                        self.data_table,
+                        self._pk_names,
+                        chunk_idx,
+                        supports_values_join=self.dbconn.supports_values_join,
                     )
-                    chunk_df = pd.read_sql_query(chunk_sql, con=con)
-
-                    res.append(chunk_df)
+                    rows.extend(con.execute(chunk_sql).fetchall())
 
-            return pd.concat(res, ignore_index=True)
+            return pd.DataFrame(rows, columns=columns)
 
         else:
             with self.dbconn.con.begin() as con:
@@ -307,7 +402,12 @@ class TableStoreDB(TableStore):
             sql, self.data_table, self.primary_keys, run_config
         )
 
-        with self.dbconn.con.execution_options(stream_results=True).begin() as con:
+        # yield_per в дополнение к stream_results ограничивает размер
+        # порции, которую драйвер поднимает с server-side курсора, так что
+        # в памяти не оказывается больше одного чанка строк
+        with self.dbconn.con.execution_options(
+            stream_results=True, yield_per=chunksize
+        ).begin() as con:
             yield from pd.read_sql_query(
                 sql,
                 con=con,
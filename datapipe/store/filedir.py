@@ -2,10 +2,13 @@ import base64
 import io
 import itertools
 import json
+import mmap
+import os
 import re
 from abc import ABC
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import IO, Any, Dict, Iterator, List, Optional, Union, cast
+from typing import IO, Any, Dict, Iterator, List, Optional, Tuple, Union, cast
 
 import fsspec
 import numpy as np
@@ -243,6 +246,11 @@ class TableStoreFiledir(TableStore):
         self.filename_match = _pattern_to_match(filename_pattern_for_match)
         self.filename_match_first_suffix = _pattern_to_match(self.filename_patterns[0])
 
+        # Матчинг идет на каждый файл - компилируем регулярки один раз
+        # вместо обращения в кэш re на каждый вызов
+        self._match_re = re.compile(self.filename_match)
+        self._match_first_suffix_re = re.compile(self.filename_match_first_suffix)
+
         # Any * and ** pattern check
         if "*" in path:
             if readonly is not None and not readonly:
@@ -311,17 +319,17 @@ class TableStoreFiledir(TableStore):
         Например для шаблона filedir/{id}.(jpg|png) и индекса id=0
           ['filedir/0.jpg', 'filedir/0.png']
         """
-        return [
-            re.sub(r"\{([^/]+?)\}", Replacer(idxs_values), pat)
-            for pat in self.filename_patterns
-        ]
+        # Шаблон {key} совпадает с синтаксисом format - подставляем значения
+        # по имени через format_map вместо regex-замены со счетчиком
+        mapping = dict(zip(self.attrnames, idxs_values))
+        return [pat.format_map(mapping) for pat in self.filename_patterns]
 
     def _idxs_values_from_filepath(self, filepath: str) -> Dict[str, Any]:
         """
         По пути возвращает список индексов согласно шаблону
         """
         _, filepath = fsspec.core.split_protocol(filepath)
-        m = re.match(self.filename_match, filepath)
+        m = self._match_re.match(filepath)
         assert (
             m is not None
         ), f"Filepath {filepath} does not match the pattern {self.filename_match}"
@@ -358,16 +366,15 @@ class TableStoreFiledir(TableStore):
             adapter = self.adapter
 
         # WARNING: Здесь я поставил .drop(columns=self.attrnames), тк ключи будут хранится снаружи, в имени
-        for row_idx, data in zip(
-            df.index,
-            cast(
-                List[Dict[str, Any]], df.drop(columns=self.attrnames).to_dict("records")
-            ),
-        ):
-            attrnames_series = df.loc[row_idx, self.attrnames]
-            assert isinstance(attrnames_series, pd.Series)
+        records = cast(
+            List[Dict[str, Any]], df.drop(columns=self.attrnames).to_dict("records")
+        )
+        # Значения ключей вынимаем одним срезом, а не .loc на каждую строку
+        idxs_values_list = cast(
+            List[List[str]], df[self.attrnames].to_numpy().tolist()
+        )
 
-            idxs_values = attrnames_series.tolist()
+        def _write_one(data: Dict[str, Any], idxs_values: List[str]) -> None:
             filepath = self._filenames_from_idxs_values(idxs_values)[
                 0
             ]  # берем первый суффикс
@@ -378,6 +385,19 @@ class TableStoreFiledir(TableStore):
             with self.filesystem.open(filepath, f"w{self.adapter.mode}") as f:
                 self.adapter.dump(data, f)
 
+        if self.protocol is None or self.protocol == "file":
+            for data, idxs_values in zip(records, idxs_values_list):
+                _write_one(data, idxs_values)
+        else:
+            # Запись в удаленную файловую систему упирается в сеть - пишем
+            # файлы параллельно, как и при чтении
+            with ThreadPoolExecutor(max_workers=32) as pool:
+                for future in [
+                    pool.submit(_write_one, data, idxs_values)
+                    for data, idxs_values in zip(records, idxs_values_list)
+                ]:
+                    future.result()
+
     def _read_rows_fast(
         self,
         idx: IndexDF,
@@ -446,34 +466,65 @@ class TableStoreFiledir(TableStore):
                     file_open = found_files[0]
                     yield file_open
 
-        df_records = []
-        for file_open in _iterate_files():
+        local = self.protocol is None or self.protocol == "file"
+
+        def _load_one(file_open) -> Dict[str, Any]:
+            if local and adapter.mode == "b":
+                # Локальный бинарный файл отдаем адаптеру через mmap -
+                # парсер читает прямо из page cache, без промежуточной
+                # копии содержимого в Python-буфер
+                with open(file_open.path, "rb") as raw:
+                    if os.fstat(raw.fileno()).st_size > 0:
+                        with mmap.mmap(
+                            raw.fileno(), 0, access=mmap.ACCESS_READ
+                        ) as mm:
+                            # mmap ведет себя как файл на чтение, но не
+                            # покрывается типом IO[Any]
+                            return adapter.load(cast(IO[Any], mm))
+
+                    return adapter.load(raw)
+
             with file_open as f:
-                data = {}
+                return adapter.load(f)
 
-                if read_data:
-                    data = adapter.load(f)
+        def _read_one(file_open) -> Dict[str, Any]:
+            data: Dict[str, Any] = {}
 
-                    attrnames_in_data = [
-                        attrname for attrname in self.attrnames if attrname in data
-                    ]
-                    assert len(attrnames_in_data) == 0, (
-                        f"Found repeated keys inside data that are already used (from scheme): "
-                        f"{attrnames_in_data}. "
-                        f"Remove these keys from data."
-                    )
+            if read_data:
+                data = _load_one(file_open)
 
-                idxs_values = self._idxs_values_from_filepath(file_open.path)
-                data.update(idxs_values)
+                attrnames_in_data = [
+                    attrname for attrname in self.attrnames if attrname in data
+                ]
+                assert len(attrnames_in_data) == 0, (
+                    f"Found repeated keys inside data that are already used (from scheme): "
+                    f"{attrnames_in_data}. "
+                    f"Remove these keys from data."
+                )
 
-                if self.add_filepath_column:
-                    assert "filepath" not in data, (
-                        "The key 'filepath' is already exists in data. "
-                        "Switch argument add_filepath_column to False or rename this key in input data."
-                    )
-                    data["filepath"] = f"{self.protocol_str}{file_open.path}"
+            idxs_values = self._idxs_values_from_filepath(file_open.path)
+            data.update(idxs_values)
+
+            if self.add_filepath_column:
+                assert "filepath" not in data, (
+                    "The key 'filepath' is already exists in data. "
+                    "Switch argument add_filepath_column to False or rename this key in input data."
+                )
+                data["filepath"] = f"{self.protocol_str}{file_open.path}"
 
-                df_records.append(data)
+            return data
+
+        if local and not read_data:
+            # Локальное чтение без парсинга содержимого - чистые обращения к
+            # page cache, поток на файл только добавляет накладных расходов
+            df_records = [_read_one(file_open) for file_open in _iterate_files()]
+        else:
+            # Для удаленных файловых систем время уходит на сетевые запросы,
+            # а при read_data и локально доминирует парсинг/декодирование
+            # (Pillow и zlib отпускают GIL) - читаем файлы параллельно,
+            # map сохраняет порядок записей
+            with ThreadPoolExecutor(max_workers=32) as pool:
+                df_records = list(pool.map(_read_one, _iterate_files()))
 
         df = pd.DataFrame(df_records)
 
@@ -485,16 +536,34 @@ class TableStoreFiledir(TableStore):
     def read_rows_meta_pseudo_df(
         self, chunksize: int = 1000, run_config: Optional[RunConfig] = None
     ) -> Iterator[DataDF]:
-        # FIXME реализовать чанкирование
-
-        files = fsspec.open_files(self.filename_glob, **self.fsspec_kwargs)
+        # Листинг с detail=True отдает атрибуты всех файлов за один обход -
+        # вместо отдельного info-запроса fs.ukey на каждый файл (на
+        # удаленных файловых системах это round-trip на файл). ukey считаем
+        # из тех же атрибутов: он меняется при изменении файла
+        files_info: Dict[str, Any] = {}
+        for pattern in self.filename_glob:
+            _, glob_path = fsspec.core.split_protocol(pattern)
+            files_info.update(self.filesystem.glob(glob_path, detail=True))
+
+        def _new_buffers() -> Tuple[Dict[str, List[str]], List[str], List[str]]:
+            return {attrname: [] for attrname in self.attrnames}, [], []
+
+        def _pseudo_df(
+            ids: Dict[str, List[str]], ukeys: List[str], filepaths: List[str]
+        ) -> DataDF:
+            return pd.DataFrame.from_records(
+                {
+                    **ids,
+                    "ukey": ukeys,
+                    **({"filepath": filepaths} if self.add_filepath_column else {}),
+                }
+            ).astype(object)
 
-        ids: Dict[str, List[str]] = {attrname: [] for attrname in self.attrnames}
-        ukeys = []
-        filepaths = []
+        ids, ukeys, filepaths = _new_buffers()
+        yielded = False
 
-        for f in files:
-            m = re.match(self.filename_match_first_suffix, f.path)
+        for filepath in sorted(files_info):
+            m = self._match_first_suffix_re.match(filepath)
 
             if m is None:
                 continue
@@ -502,19 +571,13 @@ class TableStoreFiledir(TableStore):
             for attrname in self.attrnames:
                 ids[attrname].append(m.group(attrname))
 
-            ukeys.append(files.fs.ukey(f.path))  # type: ignore
-            filepaths.append(f"{self.protocol_str}{f.path}")
+            ukeys.append(fsspec.utils.tokenize(files_info[filepath]))
+            filepaths.append(f"{self.protocol_str}{filepath}")
 
-        if len(ids) > 0:
-            pseudo_data_df = pd.DataFrame.from_records(
-                {
-                    **ids,
-                    "ukey": ukeys,
-                    **({"filepath": filepaths} if self.add_filepath_column else {}),
-                }
-            )
+            if len(ukeys) >= chunksize:
+                yield _pseudo_df(ids, ukeys, filepaths)
+                yielded = True
+                ids, ukeys, filepaths = _new_buffers()
 
-            yield pseudo_data_df.astype(object)  # type: ignore # TODO fix typing issue
-        else:
-            filepath_kw: Dict = {"filepath": []} if self.add_filepath_column else {}
-            yield pd.DataFrame({"ukey": [], **filepath_kw}).astype(object)  # type: ignore # TODO fix typing issue
+        if len(ukeys) > 0 or not yielded:
+            yield _pseudo_df(ids, ukeys, filepaths)
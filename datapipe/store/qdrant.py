@@ -1,9 +1,12 @@
 import hashlib
 import re
+import threading
 import uuid
 from collections.abc import Iterable
-from typing import Any, Dict, List, Optional, cast
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple, cast
 
+import numpy as np
 import pandas as pd
 from qdrant_client import QdrantClient
 from qdrant_client.http import models as rest
@@ -12,6 +15,23 @@ from qdrant_client.http.exceptions import UnexpectedResponse
 from datapipe.store.table_store import TableStore
 from datapipe.types import DataDF, DataSchema, IndexDF, MetaSchema
 
+UPSERT_CHUNK_SIZE = 512
+
+
+def _embeddings_to_lists(series: "pd.Series") -> List[List[Any]]:
+    """
+    Преобразует колонку эмбеддингов в список списков. Для numpy-массивов
+    одинаковой длины np.stack собирает матрицу на уровне C и конвертирует
+    одним tolist() - вместо вызова list() на каждую строку через .apply.
+    """
+
+    vals = series.to_list()
+
+    if len(vals) > 0 and isinstance(vals[0], np.ndarray):
+        return np.stack(vals).tolist()
+
+    return [list(v) for v in vals]
+
 
 class CollectionParams(rest.CreateCollection):
     pass
@@ -67,6 +87,7 @@ class QdrantStore(TableStore):
         self.inited = False
         self.client: Optional[QdrantClient] = None
         self._api_key = api_key
+        self._init_lock = threading.Lock()
 
         pk_columns = [column for column in self.schema if column.primary_key]
 
@@ -112,22 +133,28 @@ class QdrantStore(TableStore):
                 )
 
     def __check_init(self):
-        if not self.inited:
-            self.__init_collection()
-            if self.index_field:
-                self.__init_indexes()
-            self.inited = True
+        # Быстрый путь - одна проверка флага без замка; флаг ставится
+        # только после полной инициализации
+        if self.inited:
+            return
+
+        with self._init_lock:
+            if not self.inited:
+                self.__init_collection()
+                if self.index_field:
+                    self.__init_indexes()
+                self.inited = True
 
     def __get_ids(self, df):
-        return (
-            df[self.pk_field]
-            .apply(
-                lambda x: str(
-                    uuid.UUID(bytes=hashlib.md5(str(x).encode("utf-8")).digest())
-                )
-            )
-            .to_list()
-        )
+        # Генерация id на каждую строку - горячее место при больших батчах:
+        # list comprehension по голым значениям заметно дешевле, чем
+        # .apply с вызовом Python-функции через диспетчеризацию pandas
+        md5 = hashlib.md5
+        to_uuid = uuid.UUID
+        return [
+            str(to_uuid(bytes=md5(str(value).encode("utf-8")).digest()))
+            for value in df[self.pk_field].to_numpy().tolist()
+        ]
 
     def get_primary_schema(self) -> DataSchema:
         return [column for column in self.schema if column.primary_key]
@@ -142,19 +169,29 @@ class QdrantStore(TableStore):
             return
 
         assert self.client is not None
-        self.client.upsert(
-            self.name,
-            rest.Batch(
-                ids=self.__get_ids(df),
-                vectors=df[self.embedding_field].apply(list).to_list(),
-                payloads=cast(
-                    List[Dict[str, Any]],
-                    df[self.payloads_filelds].to_dict(orient="records"),
-                ),
-            ),
-            wait=True,
+
+        ids = self.__get_ids(df)
+        vectors = _embeddings_to_lists(df[self.embedding_field])
+        payloads = cast(
+            List[Dict[str, Any]],
+            df[self.payloads_filelds].to_dict(orient="records"),
         )
 
+        # Пишем чанками: промежуточные upsert'ы с wait=False не ждут
+        # применения на сервере, так что сеть перекрывается с отправкой
+        # следующего чанка; на последнем чанке дожидаемся как раньше
+        for start in range(0, len(df), UPSERT_CHUNK_SIZE):
+            end = start + UPSERT_CHUNK_SIZE
+            self.client.upsert(
+                self.name,
+                rest.Batch(
+                    ids=ids[start:end],
+                    vectors=vectors[start:end],
+                    payloads=payloads[start:end],
+                ),
+                wait=end >= len(df),
+            )
+
     def update_rows(self, df: DataDF) -> None:
         self.insert_rows(df)
 
@@ -237,8 +274,9 @@ class QdrantShardedStore(TableStore):
         self.collection_params = collection_params
         self._api_key = api_key
 
-        self.inited_collections: set = set()
+        self.inited_collections: frozenset = frozenset()
         self.client: Optional[QdrantClient] = None
+        self._init_lock = threading.Lock()
 
         self.pk_fields = [column.name for column in self.schema if column.primary_key]
         self.payloads_filelds = [
@@ -287,30 +325,41 @@ class QdrantShardedStore(TableStore):
                 )
 
     def __check_init(self, name):
-        if not self.client:
-            self.client = QdrantClient(url=self.url, api_key=self._api_key)
+        # Быстрый путь - проверка по неизменяемому снапшоту без замка
+        if self.client is not None and name in self.inited_collections:
+            return
 
-        if name not in self.inited_collections:
-            self.__init_collection(name)
-            if self.index_field:
-                self.__init_indexes(name)
-            self.inited_collections.add(name)
+        with self._init_lock:
+            if not self.client:
+                self.client = QdrantClient(url=self.url, api_key=self._api_key)
 
-    def __get_ids(self, df):
-        ids_values = (
-            df[self.pk_fields]
-            .apply(lambda x: "_".join([f"{i[0]}-{i[1]}" for i in x.items()]), axis=1)
-            .to_list()
-        )
+            if name not in self.inited_collections:
+                self.__init_collection(name)
+                if self.index_field:
+                    self.__init_indexes(name)
+                # Подменяем множество целиком, а не мутируем на месте -
+                # читатели из других потоков видят консистентный снапшот
+                self.inited_collections = self.inited_collections | {name}
 
-        return list(
-            map(
-                lambda x: str(
-                    uuid.UUID(bytes=hashlib.md5(str(x).encode("utf-8")).digest())
-                ),
-                ids_values,
+    def __get_ids(self, df):
+        # Формат ключа "key1-val1_key2-val2" сохраняем как есть - от него
+        # зависят id уже записанных точек. Сам обход переводим с
+        # .apply(axis=1) на itertuples: без создания Series на строку
+        md5 = hashlib.md5
+        to_uuid = uuid.UUID
+        return [
+            str(
+                to_uuid(
+                    bytes=md5(
+                        "_".join(
+                            f"{key}-{value}"
+                            for key, value in zip(self.pk_fields, row)
+                        ).encode("utf-8")
+                    ).digest()
+                )
             )
-        )
+            for row in df[self.pk_fields].itertuples(index=False, name=None)
+        ]
 
     def get_primary_schema(self) -> DataSchema:
         return [column for column in self.schema if column.primary_key]
@@ -325,69 +374,101 @@ class QdrantShardedStore(TableStore):
         name_params = dict(zip(self.name_params, name_values))
         return self.name_pattern.format(**name_params)
 
-    def insert_rows(self, df: DataDF) -> None:
-        for name_values, gdf in df.groupby(by=self.name_params):
-            name = self.__get_collection_name(name_values)
+    def __shard_groups(self, df: DataDF) -> List[Tuple[str, DataDF]]:
+        """
+        Разбивает датафрейм по коллекциям и инициализирует каждую из них
+        в основном потоке - дальше к шардам можно обращаться параллельно.
+        """
+
+        groups = [
+            (self.__get_collection_name(name_values), cast(DataDF, gdf))
+            for name_values, gdf in df.groupby(by=self.name_params)
+        ]
 
+        for name, _ in groups:
             self.__check_init(name)
 
-            assert self.client is not None
+        return groups
+
+    def __map_shards(self, fn: Any, groups: List[Tuple[str, DataDF]]) -> List[Any]:
+        # Шарды - независимые коллекции, запросы к ним шлем параллельно,
+        # перекрывая сетевые round-trip'ы; map сохраняет порядок групп
+        if len(groups) > 1:
+            with ThreadPoolExecutor(max_workers=min(16, len(groups))) as pool:
+                return list(pool.map(lambda args: fn(*args), groups))
+
+        return [fn(name, gdf) for name, gdf in groups]
+
+    def __insert_shard(self, name: str, gdf: DataDF) -> None:
+        assert self.client is not None
+
+        ids = self.__get_ids(gdf)
+        vectors = _embeddings_to_lists(gdf[self.embedding_field])
+        payloads = cast(
+            List[Dict[str, Any]],
+            gdf[self.payloads_filelds].to_dict(orient="records"),
+        )
+
+        for start in range(0, len(gdf), UPSERT_CHUNK_SIZE):
+            end = start + UPSERT_CHUNK_SIZE
             self.client.upsert(
                 name,
                 rest.Batch(
-                    ids=self.__get_ids(gdf),
-                    vectors=gdf[self.embedding_field].apply(list).to_list(),
-                    payloads=cast(
-                        List[Dict[str, Any]],
-                        df[self.payloads_filelds].to_dict(orient="records"),
-                    ),
+                    ids=ids[start:end],
+                    vectors=vectors[start:end],
+                    payloads=payloads[start:end],
                 ),
-                wait=True,
+                wait=end >= len(gdf),
             )
 
-    def update_rows(self, df: DataDF) -> None:
-        self.insert_rows(df)
+    def __delete_shard(self, name: str, gdf: DataDF) -> None:
+        assert self.client is not None
+        self.client.delete(
+            name,
+            rest.PointIdsList(points=self.__get_ids(gdf)),
+            wait=True,
+        )
 
-    def delete_rows(self, idx: IndexDF) -> None:
-        for name_val, gdf in idx.groupby(by=self.name_params):
-            name = self.__get_collection_name(name_val)
+    def __read_shard(self, name: str, gdf: DataDF) -> List[Dict[str, Any]]:
+        assert self.client is not None
+        response = self.client.http.points_api.get_points(
+            name,
+            point_request=rest.PointRequest(
+                ids=self.__get_ids(gdf), with_payload=True, with_vector=True
+            ),
+        )
 
-            self.__check_init(name)
+        records = []
 
-            assert self.client is not None
-            self.client.delete(
-                name,
-                rest.PointIdsList(points=self.__get_ids(gdf)),
-                wait=True,
-            )
+        assert response.result is not None
+        for point in response.result:
+            record = point.payload
 
-    def read_rows(self, idx: Optional[IndexDF] = None) -> DataDF:
-        if not idx:
-            raise Exception("Qrand doesn't support full store reading")
+            assert record is not None
+            record[self.embedding_field] = point.vector
 
-        records = []
+            records.append(record)
 
-        for name_val, gdf in idx.groupby(by=self.name_params):
-            name = self.__get_collection_name(name_val)
+        return records
 
-            self.__check_init(name)
+    def insert_rows(self, df: DataDF) -> None:
+        self.__map_shards(self.__insert_shard, self.__shard_groups(df))
 
-            assert self.client is not None
-            response = self.client.http.points_api.get_points(
-                name,
-                point_request=rest.PointRequest(
-                    ids=self.__get_ids(gdf), with_payload=True, with_vector=True
-                ),
-            )
+    def update_rows(self, df: DataDF) -> None:
+        self.insert_rows(df)
 
-            assert response.result is not None
-            for point in response.result:
-                record = point.payload
+    def delete_rows(self, idx: IndexDF) -> None:
+        self.__map_shards(self.__delete_shard, self.__shard_groups(idx))
 
-                assert record is not None
-                record[self.embedding_field] = point.vector
+    def read_rows(self, idx: Optional[IndexDF] = None) -> DataDF:
+        if not idx:
+            raise Exception("Qrand doesn't support full store reading")
 
-                records.append(record)
+        records = []
+        for shard_records in self.__map_shards(
+            self.__read_shard, self.__shard_groups(idx)
+        ):
+            records.extend(shard_records)
 
         return pd.DataFrame.from_records(records)[
             [column.name for column in self.schema]
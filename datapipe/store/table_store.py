@@ -1,4 +1,5 @@
 from abc import ABC
+from functools import cached_property
 from pathlib import Path
 from typing import Iterator, List, Optional, Union
 
@@ -19,8 +20,11 @@ class TableStore(ABC):
     def get_schema(self) -> DataSchema:
         raise NotImplementedError
 
-    @property
+    @cached_property
     def primary_keys(self) -> List[str]:
+        # Схема фиксируется при создании стора, а primary_keys дергается в
+        # горячих путях (delete_rows, update_rows, фильтры по индексу) -
+        # кэшируем список вместо обхода схемы на каждое обращение
         return [i.name for i in self.get_primary_schema()]
 
     def delete_rows(self, idx: IndexDF) -> None:
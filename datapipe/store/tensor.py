@@ -0,0 +1,67 @@
+from typing import Optional
+
+import fsspec
+import numpy as np
+import pandas as pd
+
+from datapipe.store.table_store import TableDataSingleFileStore
+from datapipe.types import DataDF, DataSchema
+
+
+class TableStoreTensor(TableDataSingleFileStore):
+    """
+    Хранит всю таблицу одним npz-файлом: значения колонки `tensor_column`
+    пакуются в непрерывный тензор формы (N, ...), ключевые колонки - в
+    отдельные массивы.
+
+    Для маленьких однородных элементов (например превью 50x50) накладные
+    расходы файла-на-строку (заголовок формата, inode, fsync) многократно
+    превышают полезные данные; один упакованный тензор пишется и читается
+    на порядки быстрее, а потребитель получает готовый батч одним чтением.
+
+    Все элементы `tensor_column` должны приводиться np.asarray к массивам
+    одинаковой формы и типа.
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        primary_schema: Optional[DataSchema] = None,
+        tensor_column: str = "tensor",
+    ):
+        super().__init__(filename, primary_schema)
+        self.tensor_column = tensor_column
+
+    def load_file(self) -> Optional[pd.DataFrame]:
+        of = fsspec.open(self.filename, "rb")
+
+        if not of.fs.exists(of.path):
+            return None
+
+        with of.open() as f:
+            npz = np.load(f, allow_pickle=False)
+
+            df = pd.DataFrame(
+                {key: npz[f"key_{key}"] for key in self.primary_keys}
+            )
+            # Строки ссылаются на срезы общего тензора без копирования
+            df[self.tensor_column] = list(npz["tensor"])
+
+            return df
+
+    def save_file(self, df: DataDF) -> None:
+        # np.asarray по списку значений дает плотный массив (<U для строк)
+        # - object-массивы npz без pickle не сохраняет
+        arrays = {
+            f"key_{key}": np.asarray(df[key].to_list()) for key in self.primary_keys
+        }
+
+        if len(df) > 0:
+            arrays["tensor"] = np.stack(
+                [np.asarray(value) for value in df[self.tensor_column]]
+            )
+        else:
+            arrays["tensor"] = np.empty((0,))
+
+        with fsspec.open(self.filename, "wb") as f:
+            np.savez(f, **arrays)
@@ -0,0 +1,21 @@
+from contextlib import nullcontext
+from typing import ContextManager
+
+from opentelemetry import trace
+
+# Провайдеры, при которых span-ы никуда не попадают; ProxyTracerProvider -
+# это провайдер по умолчанию до вызова set_tracer_provider
+_NOOP_PROVIDERS = ("NoOpTracerProvider", "ProxyTracerProvider")
+
+
+def maybe_span(tracer: trace.Tracer, name: str) -> ContextManager:
+    """
+    Создать span только если настроен реальный TracerProvider. Без
+    экспортера создание span-а - чистые накладные расходы (аллокация
+    объекта, запись времени, push контекста) на каждый батч.
+    """
+
+    if trace.get_tracer_provider().__class__.__name__ in _NOOP_PROVIDERS:
+        return nullcontext()
+
+    return tracer.start_as_current_span(name)
@@ -8,6 +8,7 @@ from typing import (
     Dict,
     List,
     NewType,
+    Sequence,
     Set,
     Tuple,
     Type,
@@ -75,8 +76,13 @@ class ChangeList:
             if self_cols != other_cols:
                 raise ValueError(f"Different IndexDF for table {table_name}")
 
+            # ChangeList хранит множество изменившихся индексов - дубли
+            # только раздувают память и дают лишние батчи дальше по пайплайну
             self.changes[table_name] = cast(
-                IndexDF, pd.concat([self.changes[table_name], idx], axis="index")
+                IndexDF,
+                pd.concat(
+                    [self.changes[table_name], idx], axis="index"
+                ).drop_duplicates(),
             )
         else:
             self.changes[table_name] = idx
@@ -95,6 +101,76 @@ class ChangeList:
 
         return changelist
 
+    @classmethod
+    def from_dict(cls, changes: Dict[str, IndexDF]) -> ChangeList:
+        """
+        Построить ChangeList из готового словаря таблица -> индекс одним
+        присваиванием, без повторных проверок append на каждую таблицу.
+        """
+
+        res = cls()
+        res.changes = dict(changes)
+
+        return res
+
+    @classmethod
+    def merge(cls, changelists: Sequence[ChangeList]) -> ChangeList:
+        """
+        Объединить несколько ChangeList в один. В отличие от цепочки
+        extend-ов делает по одному concat на таблицу вместо попарных - без
+        квадратичного копирования индексов.
+        """
+
+        pending: Dict[str, List[IndexDF]] = {}
+        for changelist in changelists:
+            for table_name, idx in changelist.changes.items():
+                pending.setdefault(table_name, []).append(idx)
+
+        res = cls()
+        for table_name, idx_list in pending.items():
+            cols = set(idx_list[0].columns)
+            for idx in idx_list[1:]:
+                if set(idx.columns) != cols:
+                    raise ValueError(f"Different IndexDF for table {table_name}")
+
+            if len(idx_list) == 1:
+                res.changes[table_name] = idx_list[0]
+            else:
+                res.changes[table_name] = cast(
+                    IndexDF,
+                    pd.concat(idx_list, axis="index").drop_duplicates(),
+                )
+
+        return res
+
+
+def to_arrow_dtypes(df: pd.DataFrame, schema: DataSchema) -> pd.DataFrame:
+    """
+    Переводит описанные в schema колонки df на pyarrow-типы (pd.ArrowDtype).
+
+    Строковые колонки в object-dtype хранят каждое значение отдельным
+    Python-объектом; arrow-строки в разы компактнее и быстрее в isin,
+    sort_values и groupby. Требует pandas >= 2.0 и установленный pyarrow
+    (экстра `arrow`), поэтому применяется явно на границе пайплайна, а не
+    по умолчанию.
+    """
+
+    import pyarrow as pa
+    from sqlalchemy import Integer, String
+
+    lookup = {
+        String: pd.ArrowDtype(pa.string()),
+        Integer: pd.ArrowDtype(pa.int64()),
+    }
+
+    dtypes = {
+        column.name: lookup[type(column.type)]
+        for column in schema
+        if column.name in df.columns and type(column.type) in lookup
+    }
+
+    return df.astype(dtypes)
+
 
 def data_to_index(data_df: DataDF, primary_keys: List[str]) -> IndexDF:
     return cast(IndexDF, data_df[primary_keys])
@@ -108,10 +184,23 @@ def index_difference(idx1_df: IndexDF, idx2_df: IndexDF) -> IndexDF:
     assert sorted(idx1_df.columns) == sorted(idx2_df.columns)
     cols = idx1_df.columns.to_list()
 
-    idx1_idx = idx1_df.set_index(cols).index
-    idx2_idx = idx2_df.set_index(cols).index
+    if len(cols) == 1:
+        # Одна колонка - хэшированный isin без построения индекса
+        key = cols[0]
+        mask = ~idx1_df[key].isin(idx2_df[key].to_numpy())
+
+        res = idx1_df.loc[mask, cols].drop_duplicates()
+        return cast(IndexDF, res.reset_index(drop=True))
+
+    # Анти-джойн через merge с индикатором - хэш-джойн за O(N) вместо
+    # сортировки MultiIndex с поэлементным сравнением кортежей в
+    # Index.difference
+    merged = idx1_df[cols].merge(
+        idx2_df[cols].drop_duplicates(), on=cols, how="left", indicator=True
+    )
 
-    return cast(IndexDF, idx1_idx.difference(idx2_idx).to_frame(index=False))
+    res = merged.loc[merged["_merge"] == "left_only", cols].drop_duplicates()
+    return cast(IndexDF, res.reset_index(drop=True))
 
 
 def index_intersection(idx1_df: IndexDF, idx2_df: IndexDF) -> IndexDF:
@@ -1,4 +1,8 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 import pandas as pd
+from PIL import Image
 
 from datapipe.compute import Catalog, DatapipeApp, Pipeline, Table
 from datapipe.datatable import DataStore
@@ -14,12 +18,53 @@ input_images_tbl = Table(
 
 preprocessed_images_tbl = Table(
     name="preprocessed_images",
-    store=TableStoreFiledir("output/{id}.png", PILFile("png")),
+    # compress_level=1 вместо дефолтной 6: zlib-кодирование - основная
+    # стоимость записи PNG, а маленькие превью сжимаются на первом уровне
+    # почти так же хорошо
+    store=TableStoreFiledir("output/{id}.png", PILFile("png", compress_level=1)),
 )
 
 
-def batch_preprocess_images(df: pd.DataFrame) -> pd.DataFrame:
-    df["image"] = df["image"].apply(lambda im: im.resize((50, 50)))
+# Pillow отпускает GIL внутри resize, поэтому пул потоков загружает все
+# ядра без затрат на pickle PIL-объектов между процессами
+_resize_pool = ThreadPoolExecutor(max_workers=os.cpu_count())
+
+
+THUMBNAIL_SIZE = (50, 50)
+# BILINEAR задаем явно: дефолтный BICUBIC заметно дороже, а для
+# уменьшения в 10+ раз разницы в качестве нет
+RESAMPLE = Image.Resampling.BILINEAR
+
+
+def _resize_one(
+    im: Image.Image,
+    size: "tuple" = THUMBNAIL_SIZE,
+    resample: int = RESAMPLE,
+) -> Image.Image:
+    # Размер и фильтр привязаны дефолтными аргументами - в горячем вызове
+    # нет ни аллокации кортежа, ни обращения к глобальным именам.
+    # reducing_gap сначала уменьшает картинку быстрым целочисленным
+    # box-фильтром и только остаток ресемплит - свертка не гоняется по
+    # полноразмерному буферу
+    return im.resize(size, resample, reducing_gap=2.0)
+
+
+def _quantize_one(im: Image.Image) -> Image.Image:
+    # 64 цветов палитры для превью хватает, а палитровый PNG сжимается и
+    # кодируется в разы быстрее 24-битного RGB
+    return im.quantize(colors=64, method=Image.Quantize.FASTOCTREE)
+
+
+def batch_preprocess_images(df: pd.DataFrame, quantize: bool = False) -> pd.DataFrame:
+    # Картинки чанка независимы - ресайзим их параллельно; map сохраняет
+    # порядок строк. Итерируем голый object-массив, минуя pandas-обертку
+    # на каждый элемент
+    images = list(_resize_pool.map(_resize_one, df["image"].to_numpy()))
+
+    if quantize:
+        images = list(_resize_pool.map(_quantize_one, images))
+
+    df["image"] = images
     return df
 
 
@@ -31,6 +76,9 @@ pipeline = Pipeline(
             inputs=[input_images_tbl],
             outputs=[preprocessed_images_tbl],
             chunk_size=100,
+            # Опциональное квантование в палитру: включайте, когда потеря
+            # точности цвета для превью допустима
+            kwargs=dict(quantize=False),
         ),
     ]
 )
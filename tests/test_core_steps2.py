@@ -1,11 +1,11 @@
 # Ex test_compute
 
 # from typing import cast
-# import pytest
 
 import time
 
 import pandas as pd
+import pytest
 from sqlalchemy import Column, String
 from sqlalchemy.sql.sqltypes import Integer
 
@@ -350,6 +350,57 @@ def test_transform_with_changelist(dbconn):
     assert_df_equal(next_change_list.changes["tbl2"], changes_idx, index_cols=idx_keys)
 
 
+def test_changelist_from_dict():
+    idx = IndexDF(TEST_DF1_1[["item_id", "pipeline_id"]])
+
+    change_list = ChangeList.from_dict({"tbl1": idx})
+
+    assert list(change_list.changes.keys()) == ["tbl1"]
+    assert_df_equal(
+        change_list.changes["tbl1"], idx, index_cols=["item_id", "pipeline_id"]
+    )
+
+    assert ChangeList.from_dict({}).empty()
+
+
+def test_changelist_merge():
+    idx_keys = ["item_id", "pipeline_id"]
+
+    idx1 = IndexDF(TEST_DF1_1.loc[0:4, idx_keys])
+    idx2 = IndexDF(TEST_DF1_1.loc[5:9, idx_keys])
+
+    merged = ChangeList.merge(
+        [
+            ChangeList.create("tbl1", idx1),
+            # Пересекается с idx1 - дубли должны схлопнуться
+            ChangeList.create("tbl1", idx1),
+            ChangeList.create("tbl1", idx2),
+            ChangeList.create("tbl2", idx2),
+        ]
+    )
+
+    assert sorted(merged.changes.keys()) == ["tbl1", "tbl2"]
+    assert_df_equal(
+        merged.changes["tbl1"], TEST_DF1_1[idx_keys], index_cols=idx_keys
+    )
+    assert_df_equal(merged.changes["tbl2"], idx2, index_cols=idx_keys)
+
+
+def test_changelist_merge_empty():
+    assert ChangeList.merge([]).empty()
+    assert ChangeList.merge([ChangeList(), ChangeList()]).empty()
+
+
+def test_changelist_merge_mismatched_columns():
+    idx1 = IndexDF(TEST_DF1_1[["item_id", "pipeline_id"]])
+    idx2 = IndexDF(TEST_DF1_1[["item_id"]])
+
+    with pytest.raises(ValueError):
+        ChangeList.merge(
+            [ChangeList.create("tbl1", idx1), ChangeList.create("tbl1", idx2)]
+        )
+
+
 def test_batch_transform_with_entity(dbconn):
     ds = DataStore(dbconn, create_meta_table=True)
 
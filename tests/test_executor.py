@@ -0,0 +1,74 @@
+from typing import List, Optional, cast
+
+import pandas as pd
+
+from datapipe.datatable import DataStore
+from datapipe.executor import ExecutorConfig, MultiThreadExecutor
+from datapipe.run_config import RunConfig
+from datapipe.types import ChangeList, IndexDF
+
+
+def make_idx_gen(n_batches: int = 5, batch_size: int = 10) -> List[IndexDF]:
+    return [
+        cast(
+            IndexDF,
+            pd.DataFrame({"id": [i * batch_size + j for j in range(batch_size)]}),
+        )
+        for i in range(n_batches)
+    ]
+
+
+def process_fn(
+    ds: DataStore, idx: IndexDF, run_config: Optional[RunConfig] = None
+) -> ChangeList:
+    return ChangeList.create("tbl", idx)
+
+
+def run_and_check(
+    executor: MultiThreadExecutor,
+    ds: DataStore,
+    executor_config: Optional[ExecutorConfig] = None,
+) -> None:
+    idx_gen = make_idx_gen()
+
+    changes = executor.run_process_batch(
+        name="test_step",
+        ds=ds,
+        idx_count=len(idx_gen),
+        idx_gen=idx_gen,
+        process_fn=process_fn,
+        executor_config=executor_config,
+    )
+
+    assert set(changes.changes["tbl"]["id"]) == set(range(50))
+
+
+def test_multi_thread_executor(dbconn) -> None:
+    ds = DataStore(dbconn, create_meta_table=True)
+
+    # Форсируем многопоточную ветку: process_fn не трогает базу, поэтому
+    # тест работает одинаково и на sqlite, и на postgres
+    ds.meta_dbconn.supports_concurrent_writes = True
+
+    run_and_check(MultiThreadExecutor(max_workers=4), ds)
+
+
+def test_multi_thread_executor_parallelism_cap(dbconn) -> None:
+    ds = DataStore(dbconn, create_meta_table=True)
+    ds.meta_dbconn.supports_concurrent_writes = True
+
+    run_and_check(
+        MultiThreadExecutor(max_workers=4),
+        ds,
+        executor_config=ExecutorConfig(parallelism=1),
+    )
+
+
+def test_multi_thread_executor_fallback_to_single_thread(dbconn) -> None:
+    ds = DataStore(dbconn, create_meta_table=True)
+
+    # Без поддержки конкурентной записи исполнитель обязан отработать
+    # последовательно с тем же результатом
+    ds.meta_dbconn.supports_concurrent_writes = False
+
+    run_and_check(MultiThreadExecutor(max_workers=4), ds)
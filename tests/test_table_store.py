@@ -11,6 +11,7 @@ from datapipe.store.filedir import JSONFile, TableStoreFiledir
 from datapipe.store.pandas import TableStoreExcel, TableStoreJsonLine
 from datapipe.store.redis import RedisStore
 from datapipe.store.table_store import TableStore
+from datapipe.store.tensor import TableStoreTensor
 from datapipe.types import DataDF, IndexDF, data_to_index
 
 from .util import assert_df_equal, assert_ts_contains
@@ -232,6 +233,46 @@ FILEDIR_DATA_PARAMS = [
 ]
 
 
+# TableStoreTensor сохраняет только ключевые колонки и tensor_column,
+# поэтому датафреймы без колонки name; price играет роль тензора-скаляра
+TENSOR_DATA_PARAMS = [
+    pytest.param(
+        pd.DataFrame(
+            {
+                "id": range(100),
+                "price": [1000 + i for i in range(100)],
+            }
+        ),
+        [Column("id", Integer, primary_key=True)],
+        id="int_id",
+    ),
+    pytest.param(
+        pd.DataFrame(
+            {
+                "id": [f"id_{i}" for i in range(100)],
+                "price": [1000 + i for i in range(100)],
+            }
+        ),
+        [Column("id", String(100), primary_key=True)],
+        id="str_id",
+    ),
+    pytest.param(
+        pd.DataFrame(
+            {
+                "id_int": range(100),
+                "id_str": [f"id_{i}" for i in range(100)],
+                "price": [1000 + i for i in range(100)],
+            }
+        ),
+        [
+            Column("id_int", Integer, primary_key=True),
+            Column("id_str", String(100), primary_key=True),
+        ],
+        id="multi_id",
+    ),
+]
+
+
 class CasesTableStore:
     @case(tags=["supports_delete", "supports_read_nonexistent_rows"])
     @parametrize("df,schema", DATA_PARAMS)
@@ -298,6 +339,25 @@ class CasesTableStore:
     def case_excel(self, tmp_dir, df, schema):
         return (TableStoreExcel(tmp_dir / "data.xlsx", primary_schema=schema), df)
 
+    @case(
+        tags=[
+            "supports_delete",
+            "supports_read_all_rows",
+            "supports_read_nonexistent_rows",
+            "supports_read_meta_pseudo_df",
+        ]
+    )
+    @parametrize("df,schema", TENSOR_DATA_PARAMS)
+    def case_tensor(self, tmp_dir, df, schema):
+        return (
+            TableStoreTensor(
+                str(tmp_dir / "data.npz"),
+                primary_schema=schema,
+                tensor_column="price",
+            ),
+            df,
+        )
+
     @case(
         tags=[
             "supports_delete",